@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""Time the processors, the perspective transform and the whole pipeline.
+
+Usage:
+
+    ./run_benchmarks.py --output results.json
+    ./run_benchmarks.py --quick --compare results.json
+
+Every benchmark runs on synthetic receipts (see synthetic.py) at several
+resolutions, skew angles, clutter levels and line densities. Each processor
+gets the image it would get in the pipeline, so the timings reflect real
+inputs. The results are stored as JSON together with the versions they were
+measured with, and --compare prints the change against an earlier run.
+
+The crops of the downscaled detection (process_array with max_dim) are also
+compared with those at full resolution and with the receipt itself, over
+several receipts per case, so a faster max_dim can't silently cost quality.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'ext')]
+
+import cv2
+import numpy
+
+import crop_morphology
+import image_io
+import processors
+import transform
+from synthetic import synthetic_receipt
+
+BASE_CASE = {'height': 2000, 'skew': 5.0, 'clutter': 0.5, 'density': 1.0}
+# downscaled detection sizes whose crops are compared with full resolution
+QUALITY_MAX_DIMS = [1024, 1500, 2048]
+QUALITY_SEEDS = 8
+VARIATIONS = {
+    'height': [1000, 4000],
+    'skew': [0.0, 15.0],
+    'clutter': [0.0, 1.0],
+    'density': [0.5, 2.0],
+}
+
+
+def cases(quick=False):
+    """The base case and the variations of one parameter at a time."""
+    if quick:
+        # still over the max_dim of the downscaled process_image benchmark
+        return [dict(BASE_CASE, height=1500)]
+    result = [dict(BASE_CASE)]
+    for key, values in sorted(VARIATIONS.items()):
+        result.extend(dict(BASE_CASE, **{key: value}) for value in values)
+    return result
+
+
+def measure(function, repeat):
+    """Call function repeat times, return the timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmarks(image, corners):
+    """Yield (name, params, function) for everything to time on one receipt."""
+    # the pipeline steps, on the input they get in the pipeline
+    pipeline = crop_morphology.build_pipeline()
+    current = image
+    for index, step in enumerate(pipeline.steps):
+        yield ('processors.%s' % step.name, dict(step.params, step=index + 1),
+               lambda step=step, current=current: step(image, current))
+        current = step(image, current)
+
+    # the processors the pipeline doesn't use
+    gray = processors.gray(image, image)
+    yield 'processors.gray', {}, lambda: processors.gray(image, image)
+    yield 'processors.gaussian_blur', {'kernel_size': (9, 9)}, lambda: processors.gaussian_blur(image, gray, (9, 9))
+    yield 'processors.otsu_threshold', {}, lambda: processors.otsu_threshold(image, gray)
+    yield 'processors.sharpen', {}, lambda: processors.sharpen(image, gray)
+    yield 'processors.expand', {'border_size': 50}, lambda: processors.expand(image, gray, 50)
+    yield 'processors.crop', {'border_size': 50}, lambda: processors.crop(image, gray, 50)
+    yield 'processors.binarize_text', {}, lambda: processors.binarize_text(image, image)
+    yield 'processors.deskew', {}, lambda: processors.deskew(image, image)
+
+    yield 'transform.four_point_transform', {}, lambda: transform.four_point_transform(image, corners)
+
+    with tempfile.TemporaryDirectory(prefix='bench-') as folder:
+        path = os.path.join(folder, 'receipt.png')
+        image_io.write(path, image)
+        out_path = os.path.join(folder, 'receipt.crop.png')
+        yield 'crop_morphology.process_image', {}, lambda: crop_morphology.process_image(path, out_path, debug=False)
+        yield ('crop_morphology.process_image', {'max_dim': 1024},
+               lambda: crop_morphology.process_image(path, out_path, debug=False, max_dim=1024))
+
+
+def box_iou(crop1, crop2):
+    """Intersection over union of two inclusive (x1, y1, x2, y2) crops, 0 for a missing crop."""
+    if crop1 is None or crop2 is None:
+        return 0.0
+    width = min(crop1[2], crop2[2]) - max(crop1[0], crop2[0]) + 1
+    height = min(crop1[3], crop2[3]) - max(crop1[1], crop2[1]) + 1
+    intersection = max(0, width) * max(0, height)
+    area = lambda crop: (crop[2] - crop[0] + 1) * (crop[3] - crop[1] + 1)
+    return intersection / float(area(crop1) + area(crop2) - intersection)
+
+
+def crop_quality(case_list, seeds=QUALITY_SEEDS, max_dims=QUALITY_MAX_DIMS, quiet=False):
+    """Compare the crops of downscaled detection with those at full resolution.
+
+    Every case is run on receipts of seeds 0 to seeds - 1. For every max_dim
+    the result holds the mean IoU of the crops with the full resolution crops
+    (iou_full), with the bounding box of the receipt (iou_receipt), and the
+    same for the full resolution crops (full_iou_receipt).
+    """
+    results = []
+    for case in case_list:
+        receipts = []
+        for seed in range(seeds):
+            image, corners = synthetic_receipt(seed=seed, **case)
+            receipt = tuple(int(value) for value in numpy.concatenate([corners.min(axis=0), corners.max(axis=0)]))
+            crop = crop_morphology.process_array(image)[1]['crop']
+            receipts.append((image, receipt, crop))
+
+        for max_dim in max_dims:
+            if max_dim >= max(receipts[0][0].shape[:2]):
+                continue
+            iou_full, iou_receipt = [], []
+            for image, receipt, crop in receipts:
+                downscaled_crop = crop_morphology.process_array(image, max_dim=max_dim)[1]['crop']
+                iou_full.append(box_iou(downscaled_crop, crop))
+                iou_receipt.append(box_iou(downscaled_crop, receipt))
+            result = {
+                'benchmark': 'crop_morphology.crop_quality',
+                'params': {'max_dim': repr(max_dim)},
+                'case': case,
+                'seeds': seeds,
+                'iou_full': statistics.mean(iou_full),
+                'iou_receipt': statistics.mean(iou_receipt),
+                'full_iou_receipt': statistics.mean(box_iou(crop, receipt) for _, receipt, crop in receipts),
+            }
+            results.append(result)
+            if not quiet:
+                print('%-50s %-50s IoU %.3f with full, %.3f (full %.3f) with the receipt' % (
+                    describe(result), describe_case(case), result['iou_full'], result['iou_receipt'],
+                    result['full_iou_receipt']))
+    return results
+
+
+def run(case_list, repeat, only=None, quiet=False):
+    results = []
+    for case in case_list:
+        image, corners = synthetic_receipt(**case)
+        for name, params, function in benchmarks(image, corners):
+            if only and only not in name:
+                continue
+            function()  # warm up
+            timings = measure(function, repeat)
+            result = {
+                'benchmark': name,
+                'params': {key: repr(value) for key, value in params.items()},
+                'case': case,
+                'repeat': repeat,
+                'min_seconds': min(timings),
+                'median_seconds': statistics.median(timings),
+                'mean_seconds': statistics.mean(timings),
+            }
+            results.append(result)
+            if not quiet:
+                print('%-50s %-50s %9.4fs' % (describe(result), describe_case(case), result['median_seconds']))
+    return results
+
+
+def describe(result):
+    params = ', '.join('%s=%s' % item for item in sorted(result['params'].items()))
+    return '%s(%s)' % (result['benchmark'], params)
+
+
+def describe_case(case):
+    return ' '.join('%s=%s' % item for item in sorted(case.items()))
+
+
+def result_key(result):
+    return result['benchmark'], json.dumps(result['params'], sort_keys=True), json.dumps(result['case'], sort_keys=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline):
+    """Print the median time of every benchmark against the baseline run.
+
+    For the crop quality results the IoU with the receipt is compared instead.
+    """
+    old = {result_key(result): result for result in baseline['results']}
+    for result in results:
+        previous = old.get(result_key(result))
+        if previous is None:
+            continue
+        if 'iou_receipt' in result:
+            print('%-50s %-50s IoU %.3f -> %.3f' % (
+                describe(result), describe_case(result['case']), previous['iou_receipt'], result['iou_receipt']))
+            continue
+        speedup = previous['median_seconds'] / max(result['median_seconds'], 1e-9)
+        print('%-50s %-50s %9.4fs -> %9.4fs  %5.2fx' % (
+            describe(result), describe_case(result['case']), previous['median_seconds'],
+            result['median_seconds'], speedup))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the receipt processors on synthetic receipts.')
+    parser.add_argument('--output', default='benchmark.json', help='write the results to this JSON file')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark (default: 5)')
+    parser.add_argument('--quick', action='store_true', help='only run a single small receipt')
+    parser.add_argument('--only', help='only run benchmarks whose name contains this')
+    parser.add_argument('--compare', help='print the speedup against the results in this JSON file')
+    parser.add_argument('--threads', type=int, default=None, help='number of OpenCV threads')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    results = run(cases(args.quick), args.repeat, args.only)
+    if not args.only or args.only in 'crop_morphology.crop_quality':
+        results.extend(crop_quality(cases(args.quick), seeds=3 if args.quick else QUALITY_SEEDS))
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            compare(results, json.load(f))
@@ -0,0 +1,96 @@
+"""Generate synthetic receipt photos.
+
+A receipt is a strip of paper with lines of text and a few ruled lines,
+rotated by skew degrees and laid on a background with clutter: a lighting
+gradient, random shapes and sensor noise. Everything is drawn from a seeded
+random state, so the same parameters always give the same image.
+"""
+import cv2
+import numpy
+
+GLYPHS = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789$.,:- ')
+
+
+def random_line(rng, length):
+    return ''.join(rng.choice(GLYPHS, length)).strip() or 'TOTAL'
+
+
+def draw_paper(rng, width, height, density):
+    """A white receipt of width x height with text lines, density 1 is a regular receipt."""
+    paper = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    paper[:] = rng.randint(230, 250, 3)
+
+    scale = width / 500.0
+    line_height = max(4, int(round(22 * scale / density)))
+    margin = int(round(25 * scale))
+    y = margin + line_height
+    while y < height - margin:
+        if rng.rand() < 0.1:
+            # ruled separator line
+            cv2.line(paper, (margin, y - line_height // 2), (width - margin, y - line_height // 2), (40, 40, 40),
+                     max(1, int(round(scale))))
+        elif rng.rand() < 0.9:
+            length = rng.randint(8, 32)
+            color = tuple(int(c) for c in rng.randint(0, 80, 3))
+            cv2.putText(paper, random_line(rng, length), (margin, y), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.55 * scale / max(1.0, density ** 0.5), color, max(1, int(round(1.2 * scale))), cv2.LINE_AA)
+        y += line_height
+    return paper
+
+
+def draw_clutter(rng, image, clutter):
+    """Draw a lighting gradient and clutter * 100 random shapes on image."""
+    height, width = image.shape[:2]
+    gradient = numpy.linspace(0.6, 1.0, width)[numpy.newaxis, :, numpy.newaxis]
+    image[:] = (image * gradient).astype(numpy.uint8)
+
+    size = max(height, width)
+    for _ in range(int(clutter * 100)):
+        color = tuple(int(c) for c in rng.randint(0, 256, 3))
+        x, y = int(rng.randint(width)), int(rng.randint(height))
+        shape = rng.randint(3)
+        if shape == 0:
+            w, h = rng.randint(size // 50 + 1, size // 8 + 2, 2)
+            cv2.rectangle(image, (x, y), (x + int(w), y + int(h)), color, int(rng.choice([-1, 2, 5])))
+        elif shape == 1:
+            cv2.circle(image, (x, y), int(rng.randint(size // 100 + 1, size // 10 + 2)), color, -1)
+        else:
+            x2, y2 = int(rng.randint(width)), int(rng.randint(height))
+            cv2.line(image, (x, y), (x2, y2), color, int(rng.randint(1, 6)))
+
+
+def synthetic_receipt(height=2000, skew=0.0, clutter=0.5, density=1.0, noise=4.0, seed=0):
+    """Return a synthetic receipt photo and the corners of the receipt in it.
+
+    The photo is height pixels high with a 3:4 aspect ratio. The receipt takes
+    up most of the height and is rotated by skew degrees, clutter (0 to 1 and
+    up) sets how busy the background is and density how many text lines the
+    receipt has relative to a regular one. The corners are a (4, 2) float32
+    array in top-left, top-right, bottom-right, bottom-left order.
+    """
+    rng = numpy.random.RandomState(seed)
+    width = height * 3 // 4
+
+    image = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    image[:] = rng.randint(60, 160, 3)
+    draw_clutter(rng, image, clutter)
+
+    paper_height = int(height * 0.8)
+    paper_width = int(paper_height * 0.4)
+    paper = draw_paper(rng, paper_width, paper_height, density)
+
+    # rotate the receipt about its center, placed at the center of the photo
+    center = (width / 2.0, height / 2.0)
+    matrix = cv2.getRotationMatrix2D((paper_width / 2.0, paper_height / 2.0), skew, 1.0)
+    matrix[:, 2] += (center[0] - paper_width / 2.0, center[1] - paper_height / 2.0)
+    corners = numpy.array([[0, 0], [paper_width, 0], [paper_width, paper_height], [0, paper_height]],
+                          dtype=numpy.float32)
+    corners = cv2.transform(corners[numpy.newaxis], matrix)[0]
+
+    cv2.warpAffine(paper, matrix, (width, height), dst=image, flags=cv2.INTER_LINEAR,
+                   borderMode=cv2.BORDER_TRANSPARENT)
+
+    if noise:
+        noisy = image + rng.normal(0, noise, image.shape)
+        image = numpy.clip(noisy, 0, 255).astype(numpy.uint8)
+    return image, corners
@@ -4,21 +4,44 @@
 Usage:
 
     ./crop_morphology.py path/to/image.jpg
+    ./crop_morphology.py --workers 8 --resume 'path/to/*.jpg'
 
-This will place the cropped image in path/to/image.crop.png.
+This will place the cropped image in path/to/image.crop.png, or in another
+format with --output-format. Several images are processed in parallel over a
+pool of worker processes.
 
 For details on the methodology, see
 http://www.danvk.org/2015/01/07/finding-blocks-of-text-in-an-image-using-python-opencv-and-numpy.html
 """
+import argparse
 import functools
 import glob
+import heapq
+import logging
+import multiprocessing
 import os
-import sys
 import random
+import tempfile
+import time
+from multiprocessing import util
 import cv2
 import numpy as np
 from scipy.ndimage.filters import rank_filter
+import image_io
 import processors
+import tiling
+from buffer_pool import BufferPool
+from debug_writer import DebugWriter
+from instrumentation import DtypeCheck, StageRecorder
+from pipeline import Pipeline
+from stage_cache import StageCache
+
+log = logging.getLogger(__name__)
+
+_debug_writer = None
+
+# intermediate images of the pipeline runs of this process
+buffer_pool = BufferPool()
 
 
 def dilate(image, n, iterations):
@@ -33,20 +56,48 @@ def dilate(image, n, iterations):
     return dilated_image
 
 
+CONTOUR_PROPS = np.dtype([('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+                          ('sum', np.float64)])
+
+
 def props_for_contours(contours, ary):
-    """Calculate bounding box & the number of set pixels for each contour."""
-    c_info = []
-    for c in contours:
+    """Calculate bounding box & the number of set pixels for each contour.
+
+    Returns a CONTOUR_PROPS structured array. All contours are filled into a
+    single label image, largest first, so a contour nested in another one
+    overwrites the part of it that it covers. The set pixels are counted per
+    label in one pass, and the count of every nested contour is then added to
+    the contour it was drawn over.
+
+    The counts are those of filling every contour on its own only when no two
+    contours share a pixel, as with the outer contours of the components
+    find_components returns. The contours of a RETR_TREE or RETR_CCOMP
+    hierarchy, whose holes share their walls with the outer contour, get
+    wrong counts.
+    """
+    c_info = np.zeros(len(contours), dtype=CONTOUR_PROPS)
+    if len(contours) == 0:
+        return c_info
+
+    for i, c in enumerate(contours):
         x, y, w, h = cv2.boundingRect(c)
-        c_im = np.zeros(ary.shape)
-        cv2.drawContours(c_im, [c], 0, 255, -1)
-        c_info.append({
-            'x1': x,
-            'y1': y,
-            'x2': x + w - 1,
-            'y2': y + h - 1,
-            'sum': np.sum(ary * (c_im > 0)) / 255
-        })
+        c_info[i] = x, y, x + w - 1, y + h - 1, 0
+
+    # label 0 is the background, contour i has label i + 1
+    labels = np.zeros(ary.shape[:2], dtype=np.int32)
+    order = sorted(range(len(contours)), key=lambda i: -abs(cv2.contourArea(contours[i])))
+    parents = np.zeros(len(contours) + 1, dtype=np.int32)
+    for i in order:
+        x, y = contours[i][0][0]
+        parents[i + 1] = labels[y, x]
+        cv2.drawContours(labels, contours, i, i + 1, -1)
+
+    set_pixels = ary > 0
+    sums = np.bincount(labels[set_pixels], weights=ary[set_pixels], minlength=len(contours) + 1)
+    for i in reversed(order):
+        sums[parents[i + 1]] += sums[i + 1]
+
+    c_info['sum'] = sums[1:] / 255
     return c_info
 
 
@@ -88,7 +139,7 @@ def remove_border(contour, edges):
     # Use a rotated rectangle (should be a good approximation of a border).
     # If it's far from a right angle, it's probably two sides of a border and
     # we should use the bounding box instead.
-    c_im = np.zeros(edges.shape)
+    c_im = np.zeros(edges.shape, dtype=np.uint8)
     r = cv2.minAreaRect(contour)
     degs = r[2]
     if angle_from_right(degs) <= 10.0:
@@ -104,87 +155,176 @@ def remove_border(contour, edges):
     return np.minimum(c_im, edges)
 
 
-def find_components(edges):
+def count_components(image):
+    """Number of 8-connected components of a binary image."""
+    return cv2.connectedComponents(image.astype(np.uint8), connectivity=8)[0] - 1
+
+
+def find_components(edges, max_components=16, bisect=False):
     """Dilate the image until there are just a few connected components.
 
     Returns contours for these components."""
-    # Perform increasingly aggressive dilation until there are just a few
-    # connected components.
-    contours = None
-    count = 21
-    n = 1
-    while count > 16:
-        n += 1
+    # Perform increasingly aggressive dilation until there are at most
+    # max_components connected components. The component count can only go
+    # down as the dilation grows, so bisect can jump ahead with a galloping
+    # search over the number of iterations instead of stepping through them.
+    limit = max(edges.shape[:2])
+    if bisect:
+        base = edges // 255
+
+        def dilated(n):
+            # n iterations of the 3x3 '+' dilation make a (2n + 1) square
+            return processors.dilate(None, base, (2 * n + 1, 2 * n + 1))
+
+        lo, hi = 1, 2
+        while hi < limit and count_components(dilated(hi)) > max_components:
+            lo, hi = hi, min(2 * hi, limit)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if count_components(dilated(mid)) > max_components:
+                lo = mid
+            else:
+                hi = mid
+        dilated_image = dilated(hi)
+    else:
+        kernel = np.ones((3, 3), dtype=np.uint8)
+        n = 2
         dilated_image = dilate(edges, n=3, iterations=n)
-        hierarchy, contours, offset = cv2.findContours(dilated_image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        count = len(contours)
+        while n < limit and count_components(dilated_image) > max_components:
+            n += 1
+            dilated_image = cv2.dilate(dilated_image, kernel)
+
+    # one outer contour per component, the holes of a component are not
+    # components of their own. RETR_EXTERNAL would also drop the components
+    # inside a hole of another one, RETR_CCOMP keeps all of them at the top
+    # level of its two level hierarchy.
+    contours, hierarchy = cv2.findContours(dilated_image, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)[-2:]
+    if hierarchy is None:
+        return []
+    return [contour for contour, parent in zip(contours, hierarchy[0][:, 3]) if parent < 0]
+
+
+class F1Objective(object):
+    """Score a crop by the F1 of its recall of set pixels and its compactness.
+
+    A component is accepted if adding it improves the F1 score, _or_ if it adds
+    remaining_frac of the remaining pixels for less than area_growth crop
+    expansion (very ad-hoc! make this smoother). Components are tried in order
+    of F1 improvement.
+    """
 
-    return contours
+    def __init__(self, total, area, remaining_frac=0.25, area_growth=0.15):
+        self.total = total
+        self.area = area
+        self.remaining_frac = remaining_frac
+        self.area_growth = area_growth
+
+    def f1(self, crop, covered_sum):
+        recall = 1.0 * covered_sum / self.total
+        prec = 1 - 1.0 * crop_area(crop) / self.area
+        if prec + recall == 0:
+            return 0.0
+        return 2 * prec * recall / (prec + recall)
+
+    def __call__(self, crop, covered_sum, new_crop, new_sum):
+        """Return (priority, accepted) for growing crop to new_crop."""
+        gain = self.f1(new_crop, new_sum) - self.f1(crop, covered_sum)
+        remaining_frac = (new_sum - covered_sum) / (self.total - covered_sum)
+        if crop_area(crop):
+            new_area_frac = 1.0 * crop_area(new_crop) / crop_area(crop) - 1
+        else:
+            new_area_frac = float('inf')
+        accepted = gain > 0 or (remaining_frac > self.remaining_frac and new_area_frac < self.area_growth)
+        return gain, accepted
 
 
-def find_optimal_components_subset(contours, edges):
+def find_optimal_components_subset(contours, edges, objective=F1Objective, quiet=False):
     """Find a crop which strikes a good balance of coverage/compactness.
 
+    objective is called with the total number of set pixels and the image area
+    and returns an objective like F1Objective. Components are kept in a
+    priority queue by the gain the objective gives them, and the accepted
+    component with the best gain is merged first. A gain is only computed
+    again when its entry reaches the top after the crop changed, so the
+    components the crop doesn't reach are not rescanned on every merge. A
+    gain can grow with the crop, so a stale entry may stay below one it would
+    now beat, and the order is only close to recomputing every gain after
+    every merge.
+
     Returns an (x1, y1, x2, y2) tuple.
     """
-    c_info = props_for_contours(contours, edges)
-    c_info.sort(key=lambda x: -x['sum'])
+    c_info = sorted(props_for_contours(contours, edges), key=lambda x: -x['sum'])
     total = np.sum(edges) / 255
     area = edges.shape[0] * edges.shape[1]
+    objective = objective(total, area)
 
     c = c_info[0]
-    del c_info[0]
-    this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-    crop = this_crop
+    crop = c['x1'], c['y1'], c['x2'], c['y2']
     covered_sum = c['sum']
 
-    while covered_sum < total:
-        changed = False
-        recall = 1.0 * covered_sum / total
-        prec = 1 - 1.0 * crop_area(crop) / area
-        f1 = 2 * (prec * recall / (prec + recall))
-        # print '----'
-        for i, c in enumerate(c_info):
-            this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-            new_crop = union_crops(crop, this_crop)
-            new_sum = covered_sum + c['sum']
-            new_recall = 1.0 * new_sum / total
-            new_prec = 1 - 1.0 * crop_area(new_crop) / area
-            new_f1 = 2 * new_prec * new_recall / (new_prec + new_recall)
-
-            # Add this crop if it improves f1 score,
-            # _or_ it adds 25% of the remaining pixels for <15% crop expansion.
-            # ^^^ very ad-hoc! make this smoother
-            remaining_frac = c['sum'] / (total - covered_sum)
-            new_area_frac = 1.0 * crop_area(new_crop) / crop_area(crop) - 1
-            if new_f1 > f1 or (
-                            remaining_frac > 0.25 and new_area_frac < 0.15):
-                print('%d %s -> %s / %s (%s), %s -> %s / %s (%s), %s -> %s' % (
-                    i, covered_sum, new_sum, total, remaining_frac,
-                    crop_area(crop), crop_area(new_crop), area, new_area_frac,
-                    f1, new_f1))
-                crop = new_crop
-                covered_sum = new_sum
-                del c_info[i]
-                changed = True
-                break
-
-        if not changed:
-            break
+    # entries are (-priority, index, version), the version counts the merges
+    # so an entry is stale once the crop grew since its gain was computed
+    version = 0
+    queue = []
+    for i in range(1, len(c_info)):
+        c = c_info[i]
+        new_crop = union_crops(crop, (c['x1'], c['y1'], c['x2'], c['y2']))
+        priority, _ = objective(crop, covered_sum, new_crop, covered_sum + c['sum'])
+        queue.append((-priority, i, version))
+    heapq.heapify(queue)
+    rejected = []
+    while queue and covered_sum < total:
+        _, i, entry_version = heapq.heappop(queue)
+        c = c_info[i]
+        this_crop = c['x1'], c['y1'], c['x2'], c['y2']
+        new_crop = union_crops(crop, this_crop)
+        new_sum = covered_sum + c['sum']
+        priority, accepted = objective(crop, covered_sum, new_crop, new_sum)
+
+        if entry_version != version and queue and -priority > queue[0][0]:
+            # no longer the best candidate now that its gain is up to date
+            heapq.heappush(queue, (-priority, i, version))
+        elif accepted:
+            if not quiet:
+                print('%d %s -> %s / %s, %s -> %s / %s (%+f)' % (
+                    i, covered_sum, new_sum, total, crop_area(crop), crop_area(new_crop), area, priority))
+            crop = new_crop
+            covered_sum = new_sum
+            version += 1
+            for entry in rejected:
+                heapq.heappush(queue, entry)
+            rejected = []
+        else:
+            rejected.append((-priority, i, version))
 
     return crop
 
 
-def pad_crop(crop, contours, edges, border_contour, pad_px=15):
+def contour_boxes(contours):
+    """Bounding (x1, y1, x2, y2) rects of contours, as an (N, 4) array."""
+    boxes = np.zeros((len(contours), 4), dtype=np.int64)
+    for i, c in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(c)
+        boxes[i] = x, y, x + w - 1, y + h - 1
+    return boxes
+
+
+def pad_crop(crop, contours, edges, border_contour, pad_px=15, quiet=False):
     """Slightly expand the crop to get full contours.
 
     This will expand to include any contours it currently intersects, but will
-    not expand past a border.
+    not expand past a border. Every round adds all the contours the crop
+    partially intersects at once and pads the result by pad_px, until the crop
+    stops changing. The contour boxes are sorted by x1 once, so each round only
+    tests the boxes that start left of the crop's right edge.
+
+    Returns the crop and the number of expansion rounds it took, which is
+    also logged at debug level.
     """
-    bx1, by1, bx2, by2 = 0, 0, edges.shape[0], edges.shape[1]
+    bx1, by1, bx2, by2 = 0, 0, edges.shape[1], edges.shape[0]
     if border_contour is not None and len(border_contour) > 0:
-        c = props_for_contours([border_contour], edges)[0]
-        bx1, by1, bx2, by2 = c['x1'] + 5, c['y1'] + 5, c['x2'] - 5, c['y2'] - 5
+        x, y, w, h = cv2.boundingRect(border_contour)
+        bx1, by1, bx2, by2 = x + 5, y + 5, x + w - 1 - 5, y + h - 1 - 5
 
     def crop_in_border(local_crop):
         x1, y1, x2, y2 = local_crop
@@ -192,103 +332,180 @@ def pad_crop(crop, contours, edges, border_contour, pad_px=15):
         y1 = max(y1 - pad_px, by1)
         x2 = min(x2 + pad_px, bx2)
         y2 = min(y2 + pad_px, by2)
-        return local_crop
+        return int(x1), int(y1), int(x2), int(y2)
 
     crop = crop_in_border(crop)
 
-    c_info = props_for_contours(contours, edges)
-    changed = False
-    for c in c_info:
-        this_crop = c['x1'], c['y1'], c['x2'], c['y2']
-        this_area = crop_area(this_crop)
-        int_area = crop_area(intersect_crops(crop, this_crop))
-        new_crop = crop_in_border(union_crops(crop, this_crop))
-        if 0 < int_area < this_area and crop != new_crop:
+    boxes = contour_boxes(contours)
+    boxes = boxes[np.argsort(boxes[:, 0], kind='stable')]
+    areas = np.maximum(0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0, boxes[:, 3] - boxes[:, 1])
+
+    rounds = 0
+    while True:
+        x1, y1, x2, y2 = crop
+        # only boxes starting left of x2 can overlap the crop by a positive width
+        end = np.searchsorted(boxes[:, 0], x2, side='left')
+        near = boxes[:end]
+        int_w = np.minimum(near[:, 2], x2) - np.maximum(near[:, 0], x1)
+        int_h = np.minimum(near[:, 3], y2) - np.maximum(near[:, 1], y1)
+        int_area = np.maximum(0, int_w) * np.maximum(0, int_h)
+        hits = near[(0 < int_area) & (int_area < areas[:end])]
+        if len(hits) == 0:
+            break
+
+        new_crop = crop_in_border((min(x1, hits[:, 0].min()), min(y1, hits[:, 1].min()),
+                                   max(x2, hits[:, 2].max()), max(y2, hits[:, 3].max())))
+        if new_crop == crop:
+            break
+        if not quiet:
             print('%s -> %s' % (str(crop), str(new_crop)))
-            changed = True
-            crop = new_crop
+        crop = new_crop
+        rounds += 1
 
-    if changed:
-        return pad_crop(crop, contours, edges, border_contour, pad_px)
-    else:
-        return crop
+    log.debug('pad_crop took %d expansion rounds over %d contours to %s', rounds, len(boxes), crop)
+    return crop, rounds
 
 
 def downscale_image(im, max_dim=2048):
     """Shrink im until its longest dimension is <= max_dim.
 
-    Returns new_image, scale (where scale <= 1).
+    Returns scale, new_image (where scale <= 1).
     """
     a, b = im.shape[:2]
     if max(a, b) <= max_dim:
         return 1.0, im
 
     scale = 1.0 * max_dim / max(a, b)
-    new_im = im.resize((int(a * scale), int(b * scale)), Image.ANTIALIAS)
+    new_im = cv2.resize(im, (int(b * scale), int(a * scale)), interpolation=cv2.INTER_AREA)
     return scale, new_im
 
 
+def scale_kernel(kernel_size, scale):
+    return tuple(max(1, int(round(k * scale))) for k in kernel_size)
+
+
 def star(f):
     return lambda args: f(*args)
 
 
-def create_pipeline(filepath, *functions, debug=False):
-    cache_folder = filepath.replace('.jpg', '') + "/"
+@functools.lru_cache(maxsize=32)
+def build_pipeline(scale=1.0):
+    """Build the receipt processing pipeline once per process.
+
+    The detection steps run on an image downscaled by scale, their kernel sizes
+    are scaled to match, and the mask is scaled back up before it is applied to
+    the original image.
+    """
+    # Canny edges are 1 pixel wide at any scale, so the line removal window
+    # stays 2 pixels across, and since the edges of a downscaled image cover
+    # 1 / scale times more of it, so does the count of set pixels that tells
+    # text from a line
+    lines_kernel = (2, max(2, int(round(20 * scale))))
+    lines_rank = -max(3, int(round(5.0 * lines_kernel[0] * lines_kernel[1] / 40 / scale)))
+    return Pipeline(functools.partial(processors.canny, sigma=0.33),
+                    processors.remove_background,
+                    functools.partial(processors.remove_lines, rank=lines_rank, kernel_size=lines_kernel),
+                    functools.partial(processors.morph_close, kernel_size=scale_kernel((10, 2), scale)),
+                    functools.partial(processors.remove_small_areas, size=100 * scale * scale),
+                    functools.partial(processors.morph_gradient, kernel_size=scale_kernel((10, 10), scale)),
+                    functools.partial(processors.morph_close, kernel_size=scale_kernel((100, 100), scale),
+                                      zero_border=True),
+                    processors.approximate_contour,
+                    functools.partial(processors.dilate, kernel_size=scale_kernel((20, 20), scale)),
+                    functools.partial(processors.morph_close, kernel_size=scale_kernel((200, 200), scale),
+                                      zero_border=True),
+                    processors.approximate_contour,
+                    processors.resize_to_original,
+                    processors.apply_mask,
+                    #functools.partial(processors.morph_gradient, kernel_size=(5, 5)),
+                    #functools.partial(processors.morph_close, kernel_size=(100, 100)),
+                    )
+
+
+def mask_bounds(image):
+    """Bounding (x1, y1, x2, y2) rect of the pixels a result kept, or None.
+
+    apply_mask sets every pixel outside the mask, so the pixels of the result
+    that are not set all lie inside the mask. Taking them from the result
+    works whichever steps ran or came from the cache.
+    """
+    # the unset rows and columns, without a point list of every pixel
+    rows = np.flatnonzero(cv2.reduce(image, 1, cv2.REDUCE_MIN) < 255)
+    cols = np.flatnonzero(cv2.reduce(image, 0, cv2.REDUCE_MIN) < 255)
+    if not len(rows):
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
+
+
+def process_array(original_image, max_dim=None, hooks=(), cache=None, pool=None, tile_size=None, tile_folder=None):
+    """Run the pipeline on an image.
+
+    With max_dim the detection steps run on a copy downscaled to at most
+    max_dim pixels, and only the final mask is applied at full resolution.
+    With a BufferPool the intermediate images are pool buffers. With tile_size
+    the local steps run on tiles of that size instead, for images too large
+    for their temporaries, and the cache and pool are not used. The frames
+    the tiles are stitched into are memory-mapped files in tile_folder, or in
+    memory without one. Only the temporaries of the local steps are bounded
+    by the tile size: the global steps still read their whole input frame
+    and return a new uint8 frame in memory.
+
+    Returns the processed image and a dict of metadata about it.
+    """
+    scale, working_image = 1.0, original_image
+    if max_dim:
+        scale, working_image = downscale_image(original_image, max_dim)
+
+    pipeline = build_pipeline(scale)
+    if tile_size:
+        runner = tiling.TiledRunner(tile_size, tile_folder)
+        image = runner(pipeline, original_image, working_image, hooks=hooks)
+    else:
+        image = pipeline(original_image, working_image, hooks=hooks, cache=cache, pool=pool)
+    height, width = original_image.shape[:2]
+    return image, {'width': width, 'height': height, 'scale': scale, 'crop': mask_bounds(image)}
+
+
+def suspicious_result(original_image, image, max_blank=0.99):
+    """True if almost all of the result is blank, i.e. no text was found."""
+    return np.count_nonzero(image == 255) > max_blank * image.size
+
+
+def start_debug_writer(**options):
+    """Start the DebugWriter of this process, it is closed when the process exits."""
+    global _debug_writer
+    _debug_writer = DebugWriter(**options)
+    util.Finalize(_debug_writer, _debug_writer.close, exitpriority=10)
+    return _debug_writer
+
+
+def debug_writer():
+    return _debug_writer or start_debug_writer()
+
+
+def process_image(path, out_path, debug=True, hooks=(), cache=None, max_dim=None, tile_size=None,
+                  tile_folder=None):
+    """Run the pipeline on the image at path and write the result to out_path.
+
+    With debug the output of every step is written to a folder named after the
+    image by the background debug writer of the process. With tile_size a .npy
+    or .raw image is memory-mapped and read a tile at a time, other formats
+    are decoded into memory, and the frames are memory-mapped in tile_folder,
+    see process_array.
+    """
+    # the input may still be mapped when the result is written
+    if os.path.abspath(out_path) == os.path.abspath(path):
+        raise ValueError('refusing to overwrite the input image %s' % path)
+    cache_folder = os.path.splitext(path)[0] + "/"
+    original_image = image_io.read(path, mmap_mode='r' if tile_size else None)
+
+    hooks = list(hooks)
     if debug:
-        if not os.path.exists(cache_folder):
-            os.makedirs(cache_folder)
-
-    step = 0
-
-    def compose_steps(second_step, first_step):
-        def inner_compose(original_image, image):
-            nonlocal step
-            step += 1
-
-            new_image = first_step(original_image, image)
-            if debug and step > 1:
-                cv2.imwrite(cache_folder + "step_" + str(step) + ".jpg", new_image)
-            return second_step(original_image, new_image)
-
-        return inner_compose
-    return functools.reduce(compose_steps, reversed(functions))
-
-
-def output_final_image(original_image, image):
-    #cv2.imwrite("tmp2.jpg", original_image)
-    #cv2.imwrite("tmp.jpg", image)
-    print("done")
-
-
-def process_image(path, out_path):
-    cache_folder = path.replace('.jpg', '') + "/"
-    if not os.path.exists(cache_folder):
-        os.makedirs(cache_folder)
-
-    original_image = cv2.imread(path)
-
-    pipeline = create_pipeline(path,
-                               functools.partial(processors.canny, sigma=0.33),
-                               processors.remove_background,
-                               functools.partial(processors.remove_lines, rank=-5, kernel_size=(2, 20)),
-                               functools.partial(processors.morph_close, kernel_size=(10, 2)),
-                               functools.partial(processors.remove_small_areas, size=100),
-                               functools.partial(processors.morph_gradient, kernel_size=(10, 10)),
-                               functools.partial(processors.expand, border_size=110),
-                               functools.partial(processors.morph_close, kernel_size=(100, 100)),
-                               functools.partial(processors.crop, border_size=110),
-                               processors.approximate_contour,
-                               functools.partial(processors.dilate, kernel_size=(20, 20)),
-                               functools.partial(processors.expand, border_size=210),
-                               functools.partial(processors.morph_close, kernel_size=(200, 200)),
-                               functools.partial(processors.crop, border_size=210),
-                               processors.approximate_contour,
-                               processors.apply_mask,
-                               #functools.partial(processors.morph_gradient, kernel_size=(5, 5)),
-                               #functools.partial(processors.morph_close, kernel_size=(100, 100)),
-                               output_final_image,
-                               debug=True)
-    #pipeline(original_image, original_image)
+        hooks.append(debug_writer().run(cache_folder))
+    image, metadata = process_array(original_image, max_dim=max_dim, hooks=hooks, cache=cache, pool=buffer_pool,
+                                    tile_size=tile_size, tile_folder=tile_folder)
+    image_io.write(out_path, image)
+    buffer_pool.give(image)
 
     test = True
     if test == True:
@@ -332,7 +549,7 @@ def process_image(path, out_path):
     cv2.imwrite(cache_folder + "step_4.jpg", original_image)
 
     crop = find_optimal_components_subset(contours, edges)
-    crop = pad_crop(crop, contours, edges, border_contour)
+    crop, _ = pad_crop(crop, contours, edges, border_contour)
 
     crop = [int(x / scale) for x in crop]  # upscale to the original image size.
     #text_im = original_image[crop[1]:crop[3], crop[0]:crop[2]]
@@ -340,15 +557,139 @@ def process_image(path, out_path):
     print('%s -> %s' % (path, out_path))
 
 
+def _init_worker(debug_options=None):
+    # Each worker is single-threaded; parallelism comes from the pool itself.
+    cv2.setNumThreads(1)
+    if debug_options is not None:
+        start_debug_writer(**debug_options)
+
+
+def _process_one(job, metrics=False, cache=None, max_dim=None, check_dtypes=False, tile_size=None,
+                 tile_folder=None):
+    path, out_path = job
+    recorder = StageRecorder() if metrics else None
+    hooks = [recorder] if recorder else []
+    if check_dtypes:
+        hooks.append(DtypeCheck(strict=True))
+    start = time.perf_counter()
+    try:
+        process_image(path, out_path, hooks=hooks, cache=cache, max_dim=max_dim, tile_size=tile_size,
+                      tile_folder=tile_folder)
+    except Exception as e:
+        return path, 'failed', time.perf_counter() - start, '%s: %s' % (type(e).__name__, e), recorder
+    return path, 'done', time.perf_counter() - start, None, recorder
+
+
+def output_path(path, extension='.png'):
+    """path/to/image.crop.png for path/to/image.jpg, whatever its extension."""
+    return os.path.splitext(path)[0] + '.crop' + extension
+
+
+def process_batch(files, workers=None, resume=False, metrics=False, cache=None, max_dim=None,
+                  debug_options=None, check_dtypes=False, tile_size=None, tile_folder=None, out_extension='.png'):
+    """Process files over a pool of worker processes.
+
+    Results are yielded in input order as (path, status, seconds, error, recorder)
+    tuples, where status is one of 'done', 'failed' or 'skipped' and recorder is
+    the StageRecorder of the image when metrics are enabled. A failing image
+    does not stop the batch. All workers share the given StageCache, and each
+    starts a DebugWriter with debug_options. With check_dtypes an image fails
+    when a step returns anything but a uint8 or bool image. With tile_size the
+    local steps run tile by tile, into frames memory-mapped in tile_folder.
+    The results are written next to the images, see output_path.
+    """
+    jobs = []
+    skipped = set()
+    for path in files:
+        out_path = output_path(path, out_extension)
+        if resume and os.path.exists(out_path):
+            skipped.add(path)
+        else:
+            jobs.append((path, out_path))
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(debug_options,)) as pool:
+        results = pool.imap(functools.partial(_process_one, metrics=metrics, cache=cache, max_dim=max_dim,
+                                              check_dtypes=check_dtypes, tile_size=tile_size,
+                                              tile_folder=tile_folder), jobs)
+        for path in files:
+            if path in skipped:
+                yield path, 'skipped', 0.0, None, None
+            else:
+                yield next(results)
+
+        # let the workers exit on their own so their debug writers are flushed
+        pool.close()
+        pool.join()
+
+
+def print_summary(results):
+    for path, status, seconds, error, _ in results:
+        print('%-8s %8.2fs  %s%s' % (status, seconds, path, '  (' + error + ')' if error else ''))
+
+    timings = [seconds for _, status, seconds, _, _ in results if status == 'done']
+    counts = {status: sum(1 for r in results if r[1] == status) for status in ('done', 'failed', 'skipped')}
+    print('%(done)d done, %(failed)d failed, %(skipped)d skipped' % counts)
+    if timings:
+        print('total %.2fs, mean %.2fs, max %.2fs per image' % (
+            sum(timings), sum(timings) / len(timings), max(timings)))
+
+
 if __name__ == '__main__':
-    if len(sys.argv) == 2 and '*' in sys.argv[1]:
-        files = glob.glob(sys.argv[1])
+    parser = argparse.ArgumentParser(description='Crop images to just the portions containing text.')
+    parser.add_argument('files', nargs='+', help='images to process, or a single quoted glob pattern')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--resume', action='store_true', help='skip images whose output already exists')
+    parser.add_argument('--output-format', choices=('.png', '.jpg', '.webp', '.npy', '.raw'), default='.png',
+                        help='format of the cropped images (default: .png)')
+    parser.add_argument('--metrics', help='write per-step timing and memory metrics to this file')
+    parser.add_argument('--metrics-format', choices=('jsonl', 'prometheus'), default='jsonl',
+                        help='format of the metrics file (default: jsonl)')
+    parser.add_argument('--max-dim', type=int, default=None,
+                        help='run detection on a copy downscaled to at most this many pixels')
+    parser.add_argument('--cache', help='cache step outputs in this folder and resume re-runs from them')
+    parser.add_argument('--cache-size', type=int, default=2048, help='cache size limit in MB (default: 2048)')
+    parser.add_argument('--check-dtypes', action='store_true',
+                        help='fail images where a step returns anything but a uint8 or bool image')
+    parser.add_argument('--tile-size', type=int, default=None, metavar='PIXELS',
+                        help='run the local steps on tiles of this size, for very large scans; .npy and .raw '
+                             'images are memory-mapped')
+    parser.add_argument('--tile-folder', default=None,
+                        help='folder of the memory-mapped frames of --tile-size (default: the temp folder)')
+    parser.add_argument('--debug-every', type=int, default=1, metavar='N',
+                        help='write the step images of one in every N images (default: 1)')
+    parser.add_argument('--debug-suspicious', action='store_true',
+                        help='only write the step images of images where no text was found')
+    parser.add_argument('--debug-format', choices=('.raw', '.jpg', '.png', '.webp', '.npy'), default='.raw',
+                        help='format of the step images (default: .raw, see ext/run_artifacts.py)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log debug messages, e.g. pad_crop rounds')
+    args = parser.parse_args()
+    # before the pool is started, so the workers inherit it
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    if len(args.files) == 1 and '*' in args.files[0]:
+        files = glob.glob(args.files[0])
         random.shuffle(files)
     else:
-        files = sys.argv[1:]
-
-    for path in files:
-        out_path = path.replace('.jpg', '.crop.jpg')
-        #if os.path.exists(out_path):
-        #    continue
-        process_image(path, out_path)
+        files = args.files
+
+    results = []
+    recorder = StageRecorder()
+    cache = StageCache(args.cache, args.cache_size * 1024 ** 2) if args.cache else None
+    debug_options = {'extension': args.debug_format, 'every': args.debug_every,
+                     'keep': suspicious_result if args.debug_suspicious else None}
+    for result in process_batch(files, workers=args.workers, resume=args.resume, metrics=bool(args.metrics),
+                                cache=cache, max_dim=args.max_dim, debug_options=debug_options,
+                                check_dtypes=args.check_dtypes, tile_size=args.tile_size,
+                                tile_folder=args.tile_folder or (tempfile.gettempdir() if args.tile_size else None),
+                                out_extension=args.output_format):
+        results.append(result)
+        print('%s -> %s' % (result[0], result[1]))
+        if result[4] is not None:
+            for record in result[4].records:
+                recorder.records.append(dict(record, image=result[0]))
+    print_summary(results)
+
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(recorder.to_json_lines() if args.metrics_format == 'jsonl' else recorder.to_prometheus())
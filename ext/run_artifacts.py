@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""List or export the .raw step images of a debug run.
+
+Usage:
+
+    ./run_artifacts.py path/to/image/
+    ./run_artifacts.py path/to/image/ --export .png
+
+Every artifact is opened lazily, so listing a run only reads the headers. With
+--export every artifact is also written next to it in a viewable format.
+"""
+import argparse
+import os
+
+import image_io
+import raw_image
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='List or export the .raw step images of a debug run.')
+    parser.add_argument('folder', help='folder the debug run wrote to')
+    parser.add_argument('--export', choices=('.png', '.jpg', '.webp', '.npy'),
+                        help='also write every artifact in this format')
+    args = parser.parse_args()
+
+    artifacts = raw_image.RunArtifacts(args.folder)
+    for name in artifacts:
+        image = artifacts.open(name)
+        size = os.path.getsize(image.path)
+        print('%-16s %-18s %-6s %-7s %10d bytes' % (name, 'x'.join(map(str, image.shape)), image.dtype,
+                                                    'packed' if image.header.packed else '', size))
+        if args.export:
+            image_io.write(os.path.join(args.folder, name + args.export), artifacts[name])
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""Run the receipt pipeline as a long-lived local service.
+
+Usage:
+
+    ./service.py --port 8080 --workers 4
+    ./service.py --socket /tmp/receipts.sock
+
+POST an encoded image to /process, optionally with ?max_dim=2048 and
+?format=.png (or .jpg, .webp, .npy, .raw). The response body is the processed
+image and the X-Metadata header holds the crop metadata as JSON. When more
+than --max-pending images are in flight the service answers 503 instead of
+queueing without bound. An image that can't be decoded or bad parameters get
+a 400, an image still processing after the timeout a 504, and it holds its
+slot until the worker is done with it.
+GET /health reports the number of images in flight.
+
+The workers are started once, with OpenCV and SciPy imported and the pipeline
+built, so a request only pays for the processing itself.
+"""
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import socketserver
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import numpy
+
+import crop_morphology
+import image_io
+
+MAX_BODY_SIZE = 64 * 1024 ** 2
+
+
+def _init_worker():
+    crop_morphology._init_worker()
+    crop_morphology.build_pipeline()
+
+
+def _process(data, max_dim, extension):
+    try:
+        image = image_io.decode(data)
+    except Exception as e:
+        raise BadRequest(str(e))
+    if image.dtype != numpy.uint8 or image.ndim not in (2, 3) or image.ndim == 3 and image.shape[2] != 3:
+        raise BadRequest('expected an 8 bit gray or BGR image, not %s %s'
+                         % (image.dtype, 'x'.join(map(str, image.shape))))
+    result, metadata = crop_morphology.process_array(image, max_dim=max_dim, pool=crop_morphology.buffer_pool)
+    encoded = image_io.encode(result, extension)
+    crop_morphology.buffer_pool.give(result)
+    return encoded, metadata
+
+
+class Busy(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    """The request, not the pipeline, is at fault."""
+
+
+class ReceiptService(object):
+    """A warm pool of pipeline workers behind a bounded number of slots."""
+
+    def __init__(self, workers=None, max_pending=None, timeout=120):
+        workers = workers or os.cpu_count()
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        self.max_pending = max_pending or 2 * workers
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def process(self, data, max_dim=None, extension='.png'):
+        """Process encoded image bytes, raise Busy when every slot is taken.
+
+        The slot is held until the worker is done with the image, not until the
+        caller stops waiting, so an image that timed out still counts as in
+        flight.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise Busy()
+        with self._lock:
+            self.pending += 1
+        try:
+            result = self.pool.apply_async(_process, (data, max_dim, extension),
+                                           callback=self._done, error_callback=self._done)
+        except Exception:
+            self._done(None)
+            raise
+        return result.get(self.timeout)
+
+    def _done(self, result):
+        # called by the pool when the task finished or failed
+        with self._lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class ReceiptHandler(http.server.BaseHTTPRequestHandler):
+    def address_string(self):
+        # clients of a unix socket have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def send_body(self, code, body, content_type, headers=()):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, code, document, headers=()):
+        self.send_body(code, json.dumps(document).encode(), 'application/json', headers)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.send_json(404, {'error': 'not found'})
+        service = self.server.service
+        self.send_json(200, {'pending': service.pending, 'max_pending': service.max_pending})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/process':
+            return self.send_json(404, {'error': 'not found'})
+
+        length = int(self.headers.get('Content-Length', 0))
+        if length <= 0:
+            return self.send_json(411, {'error': 'a Content-Length is required'})
+        if length > MAX_BODY_SIZE:
+            return self.send_json(413, {'error': 'image too large'})
+        data = self.rfile.read(length)
+
+        query = parse_qs(url.query)
+        try:
+            max_dim = int(query['max_dim'][0]) if 'max_dim' in query else None
+            if max_dim is not None and max_dim <= 0:
+                raise ValueError('max_dim must be positive')
+            extension = query.get('format', ['.png'])[0]
+            if extension not in image_io.CONTENT_TYPES:
+                raise ValueError('unsupported format %s' % extension)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        try:
+            body, metadata = self.server.service.process(data, max_dim, extension)
+        except Busy:
+            return self.send_json(503, {'error': 'too many images in flight'}, [('Retry-After', '1')])
+        except BadRequest as e:
+            return self.send_json(400, {'error': str(e)})
+        except multiprocessing.TimeoutError:
+            return self.send_json(504, {'error': 'timed out'})
+        except Exception as e:
+            return self.send_json(500, {'error': '%s: %s' % (type(e).__name__, e)})
+
+        self.send_body(200, body, image_io.CONTENT_TYPES[extension], [('X-Metadata', json.dumps(metadata))])
+
+
+class ReceiptHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class ReceiptUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, port=8080, host='127.0.0.1', socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ReceiptUnixServer(socket_path, ReceiptHandler)
+    else:
+        server = ReceiptHTTPServer((host, port), ReceiptHandler)
+    server.service = service
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the receipt pipeline over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', help='listen on this unix socket instead of a TCP port')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='images in flight before answering 503 (default: twice the workers)')
+    args = parser.parse_args()
+
+    service = ReceiptService(args.workers, args.max_pending)
+    try:
+        serve(service, args.port, args.host, args.socket)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
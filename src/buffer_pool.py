@@ -0,0 +1,71 @@
+import threading
+
+import numpy
+
+
+class BufferPool(object):
+    """Reusable image buffers keyed by shape and dtype.
+
+    take hands out a free buffer of the requested shape and dtype, or a new one
+    if there is none, and give takes it back for the next take. At most
+    max_free buffers are kept per shape and dtype, the rest are left to the
+    garbage collector. Taken buffers are not initialized.
+
+    The pool also remembers the output shape and dtype of the steps that ran
+    with it, so that a pipeline can take the buffer of a step's output before
+    the step runs again. The pipelines themselves hold no state between runs.
+    """
+
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.allocated = 0
+        self.reused = 0
+        self._free = {}
+        self._outputs = {}
+        self._lock = threading.Lock()
+
+    def take(self, shape, dtype=numpy.uint8):
+        key = (tuple(shape), numpy.dtype(dtype))
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+        return numpy.empty(*key)
+
+    def zeros(self, shape, dtype=numpy.uint8):
+        buffer = self.take(shape, dtype)
+        buffer.fill(0)
+        return buffer
+
+    def give(self, buffer):
+        """Return a buffer, only arrays owning their memory are kept."""
+        if buffer.base is not None or not buffer.flags.c_contiguous or not buffer.flags.writeable:
+            return
+        key = (buffer.shape, buffer.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) < self.max_free and not any(b is buffer for b in free):
+                free.append(buffer)
+
+    def output_of(self, step, geometry):
+        """The (shape, dtype) step returned for an input of geometry, if it did last time."""
+        with self._lock:
+            last = self._outputs.get(step)
+        if last is not None and last[0] == geometry:
+            return last[1]
+        return None
+
+    def record_output(self, step, geometry, output):
+        """Remember the output of step, an image, for an input of geometry."""
+        with self._lock:
+            self._outputs[step] = (geometry, (output.shape, output.dtype))
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._outputs.clear()
+
+    def __len__(self):
+        return sum(len(free) for free in self._free.values())
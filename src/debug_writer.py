@@ -0,0 +1,138 @@
+"""Write debug artifacts from a background thread.
+
+Encoding full resolution frames is slow, so artifacts are only copied on the
+hot path and handed to a writer thread through a bounded queue. When the
+queue is full an artifact is dropped and counted instead of blocking the
+pipeline. The first artifact that fails to be written is warned about, the
+others are counted, and the counts are warned about when the writer closes.
+"""
+import itertools
+import os
+import queue
+import threading
+import warnings
+
+import numpy
+
+import image_io
+from pipeline import Hook
+
+
+class DebugWriter(object):
+    """A background thread writing the artifacts of sampled images.
+
+    Only one in every images is sampled. With keep, the artifacts of a sampled
+    image are held until it is finished and only written if
+    keep(original_image, image) is true for the final image, e.g. when a
+    quality check fails. Artifacts are encoded as extension with the image_io
+    options (quality, compression). The default .raw keeps them lossless,
+    with masks packed to 1 bit per pixel, and costs no encoding.
+    """
+
+    def __init__(self, extension='.raw', every=1, keep=None, max_queued=16, **options):
+        self.extension = extension
+        self.every = every
+        self.keep = keep
+        self.options = options
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._count = itertools.count()
+        self._queue = queue.Queue(max_queued)
+        self._thread = threading.Thread(target=self._run, name='debug-writer', daemon=True)
+        self._thread.start()
+
+    def run(self, folder):
+        """Start a new image whose artifacts go to folder, returns its DebugRun."""
+        return DebugRun(self, folder, next(self._count) % self.every == 0)
+
+    def submit(self, path, image, copy=True):
+        """Queue image, or a copy of it, to be written to path, never blocks.
+
+        Returns False if the queue was full and the image was dropped.
+        """
+        try:
+            self._queue.put_nowait((path, image.copy() if copy else image))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, image = item
+                folder = os.path.dirname(path)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder, exist_ok=True)
+                image_io.write(path, image, **self.options)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1:
+                    warnings.warn('could not write the debug artifact %s: %s: %s, further failures are only '
+                                  'counted' % (path, type(e).__name__, e), RuntimeWarning)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued artifact is written."""
+        self._queue.join()
+
+    def close(self):
+        """Write the queued artifacts and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            if self.errors or self.dropped:
+                warnings.warn('%d debug artifacts written, %d failed, %d dropped'
+                              % (self.written, self.errors, self.dropped), RuntimeWarning)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DebugRun(Hook):
+    """The artifacts of one image, also a hook writing every pipeline step."""
+
+    def __init__(self, writer, folder, sampled):
+        self.writer = writer
+        self.folder = folder
+        self.sampled = sampled
+        self.original_image = None
+        self._held = []
+
+    def write(self, name, image):
+        """Write image as folder/name in the format of the writer."""
+        if not self.sampled or not isinstance(image, numpy.ndarray):
+            return
+        path = os.path.join(self.folder, name + self.writer.extension)
+        if self.writer.keep is None:
+            self.writer.submit(path, image)
+        else:
+            self._held.append((path, image.copy()))
+
+    def finish(self, image):
+        """Finish the image, writing the held artifacts if keep wants them."""
+        held, self._held = self._held, []
+        if held and self.writer.keep(self.original_image, image):
+            for path, artifact in held:
+                self.writer.submit(path, artifact, copy=False)
+
+    def before_run(self, original_image):
+        self.original_image = original_image
+
+    def cache_hit(self, index, step, original_image, image):
+        self.write('step_' + str(index + 1), image)
+
+    def after_step(self, index, step, original_image, image):
+        self.write('step_' + str(index + 1), image)
+
+    def after_run(self, image):
+        self.finish(image)
@@ -0,0 +1,40 @@
+"""Products derived from one image, computed once and shared.
+
+A Pipeline run makes an ImageContext of its original image and passes it to
+every processor with a context parameter, so that they share its gray image
+instead of converting it each. Products are shared, so they must not be
+modified in place.
+"""
+import cv2
+
+
+class ImageContext(object):
+    """Lazily computed products of an image.
+
+    Every product is computed on first use and cached by its parameters for
+    the lifetime of the context, which is one image.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._products = {}
+
+    def product(self, key, compute):
+        """The product cached as key, computed by compute() the first time."""
+        try:
+            return self._products[key]
+        except KeyError:
+            value = self._products[key] = compute()
+            return value
+
+    def gray(self, code=cv2.COLOR_BGR2GRAY):
+        if self.image.ndim == 2:
+            return self.image
+        return self.product(('gray', code), lambda: cv2.cvtColor(self.image, code))
+
+    def adaptive_threshold(self, block_size=251, c=20, code=cv2.COLOR_BGR2GRAY):
+        """Gaussian adaptive threshold of the gray image, as cv2.adaptiveThreshold."""
+        def compute():
+            return cv2.adaptiveThreshold(self.gray(code), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                         block_size, c)
+        return self.product(('adaptive_threshold', block_size, c, code), compute)
@@ -0,0 +1,90 @@
+"""Decode and encode images in memory.
+
+Images come in and go out as bytes, so they can be taken straight from an
+upload buffer or a queue. Besides what OpenCV encodes (.jpg, .png, .webp...)
+the .npy format and the .raw format of raw_image, which packs binary masks to
+1 bit per pixel, are supported for lossless intermediates of any dtype.
+"""
+import io
+import os
+
+import cv2
+import numpy
+
+import raw_image
+
+NPY_MAGIC = b'\x93NUMPY'
+
+CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.npy': 'application/octet-stream',
+    '.raw': 'application/octet-stream',
+}
+
+
+def decode(data, flags=cv2.IMREAD_COLOR):
+    """Decode an image from bytes, a bytearray or a memoryview.
+
+    .npy and .raw data is loaded as is, anything else is decoded by OpenCV
+    with flags.
+    """
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    if buffer[:len(NPY_MAGIC)].tobytes() == NPY_MAGIC:
+        return numpy.load(io.BytesIO(buffer), allow_pickle=False)
+    if buffer[:len(raw_image.MAGIC)].tobytes() == raw_image.MAGIC:
+        return raw_image.loads(data)
+
+    image = cv2.imdecode(buffer, flags)
+    if image is None:
+        raise ValueError('could not decode the image')
+    return image
+
+
+def encode(image, extension='.jpg', quality=95, compression=3):
+    """Encode an image to bytes in the format of extension.
+
+    quality applies to .jpg and .webp, compression (0-9) to the lossless .png.
+    """
+    extension = extension.lower()
+    if extension == '.npy':
+        out = io.BytesIO()
+        numpy.save(out, numpy.ascontiguousarray(image), allow_pickle=False)
+        return out.getvalue()
+    if extension == raw_image.EXTENSION:
+        return raw_image.dumps(image)
+
+    if extension in ('.jpg', '.jpeg'):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif extension == '.webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif extension == '.png':
+        params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    else:
+        params = []
+
+    ok, encoded = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError('could not encode the image as %s' % extension)
+    return encoded.tobytes()
+
+
+def read(path, flags=cv2.IMREAD_COLOR, mmap_mode=None):
+    """Read an image file, with mmap_mode a .npy or .raw file is memory-mapped."""
+    if mmap_mode is not None and path.lower().endswith('.npy'):
+        return numpy.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+    if mmap_mode is not None and path.lower().endswith(raw_image.EXTENSION):
+        return raw_image.load(path, mmap_mode)
+    with open(path, 'rb') as f:
+        return decode(f.read(), flags)
+
+
+def write(path, image, **options):
+    """Encode image in the format of the extension of path and write it."""
+    if path.lower().endswith(raw_image.EXTENSION):
+        return raw_image.save(path, image)
+    data = encode(image, os.path.splitext(path)[1], **options)
+    with open(path, 'wb') as f:
+        f.write(data)
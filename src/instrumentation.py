@@ -0,0 +1,148 @@
+import json
+import time
+import tracemalloc
+import warnings
+
+import numpy
+
+from pipeline import Hook
+
+
+def describe(image):
+    """Return the (shape, dtype) of an image, or (None, None) for anything else."""
+    if isinstance(image, numpy.ndarray):
+        return list(image.shape), str(image.dtype)
+    return None, None
+
+
+class StageRecorder(Hook):
+    """Record wall time, CPU time and peak memory of every pipeline step.
+
+    Peak memory is the peak of traced allocations during the step above what was
+    allocated when it started; NumPy and OpenCV output arrays are traced through
+    tracemalloc, which is started on the first run if it isn't already. A step
+    whose output came from the cache gets a record with cached set and no
+    timings.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+        self.runs = 0
+        self._start = None
+
+    def before_run(self, original_image):
+        self.runs += 1
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def cache_hit(self, index, step, original_image, image):
+        output_shape, output_dtype = describe(image)
+        self.records.append({
+            'run': self.runs,
+            'step': index + 1,
+            'stage': step.name,
+            'params': {key: repr(value) for key, value in step.params.items()},
+            'cached': True,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_bytes': None,
+            'input_shape': None,
+            'input_dtype': None,
+            'output_shape': output_shape,
+            'output_dtype': output_dtype,
+        })
+
+    def before_step(self, index, step, original_image, image):
+        memory = 0
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        self._start = (image, memory, time.process_time(), time.perf_counter())
+
+    def after_step(self, index, step, original_image, image):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        input_image, memory, start_cpu, start_wall = self._start
+        self._start = None
+
+        peak = None
+        if self.trace_memory:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - memory)
+
+        input_shape, input_dtype = describe(input_image)
+        output_shape, output_dtype = describe(image)
+        self.records.append({
+            'run': self.runs,
+            'step': index + 1,
+            'stage': step.name,
+            'params': {key: repr(value) for key, value in step.params.items()},
+            'cached': False,
+            'wall_seconds': wall - start_wall,
+            'cpu_seconds': cpu - start_cpu,
+            'peak_bytes': peak,
+            'input_shape': input_shape,
+            'input_dtype': input_dtype,
+            'output_shape': output_shape,
+            'output_dtype': output_dtype,
+        })
+
+    def to_json_lines(self):
+        return ''.join(json.dumps(record, sort_keys=True) + '\n' for record in self.records)
+
+    def to_prometheus(self, prefix='pipeline_stage'):
+        """Aggregate the records per step into a Prometheus text exposition."""
+        stages = {}
+        hits = {}
+        for record in self.records:
+            key = (record['step'], record['stage'])
+            if record.get('cached'):
+                hits[key] = hits.get(key, 0) + 1
+                continue
+            wall, cpu, peak, count = stages.get(key, (0.0, 0.0, 0, 0))
+            stages[key] = (wall + record['wall_seconds'], cpu + record['cpu_seconds'],
+                           max(peak, record['peak_bytes'] or 0), count + 1)
+
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, (step, stage), value in samples:
+                lines.append('%s_%s%s{step="%d",stage="%s"} %r' % (prefix, name, suffix, step, stage, value))
+
+        keys = sorted(stages)
+        metric('wall_seconds', 'summary', 'Wall time spent in a pipeline step.',
+               [(suffix, key, stages[key][i]) for key in keys for suffix, i in (('_sum', 0), ('_count', 3))])
+        metric('cpu_seconds', 'summary', 'CPU time spent in a pipeline step.',
+               [(suffix, key, stages[key][i]) for key in keys for suffix, i in (('_sum', 1), ('_count', 3))])
+        if self.trace_memory:
+            metric('peak_bytes', 'gauge', 'Largest peak of memory allocated by a pipeline step.',
+                   [('', key, stages[key][2]) for key in keys])
+        if hits:
+            metric('cache_hits', 'counter', 'Runs resumed from the cached output of a pipeline step.',
+                   [('_total', key, hits[key]) for key in sorted(hits)])
+        return '\n'.join(lines) + '\n'
+
+
+class DtypeCheck(Hook):
+    """Flag every step returning an image of a dtype outside of allowed.
+
+    The pipeline works on uint8 images and bool masks, anything wider is a
+    copy several times the size of the image. A violation raises a TypeError
+    when strict, otherwise it is warned about and kept in violations.
+    """
+
+    def __init__(self, allowed=(numpy.uint8, numpy.bool_), strict=False):
+        self.allowed = [numpy.dtype(dtype) for dtype in allowed]
+        self.strict = strict
+        self.violations = []
+
+    def after_step(self, index, step, original_image, image):
+        if not isinstance(image, numpy.ndarray) or image.dtype in self.allowed:
+            return
+        message = 'step %d %s returned a %s image' % (index + 1, step.name, image.dtype)
+        if self.strict:
+            raise TypeError(message)
+        warnings.warn(message, RuntimeWarning)
+        self.violations.append({'step': index + 1, 'stage': step.name, 'dtype': str(image.dtype)})
@@ -0,0 +1,58 @@
+"""Line removal for binary edge maps.
+
+remove_lines keeps the set pixels of an image whose horizontal and vertical
+windows both hold enough set pixels, which is what a rank filter in both
+orientations followed by a minimum does. On a 0/255 image the rank-th value of
+a window is set exactly when the window holds enough set pixels, so instead of
+sorting every window the set pixels are counted with running sums
+(cv2.boxFilter), one pass per orientation. The borders are reflected like scipy.ndimage's default mode,
+so the results match scipy's rank_filter.
+"""
+import cv2
+import numpy
+
+
+def is_binary(image):
+    """True for a uint8 image of only 0 and 255."""
+    return image.dtype == numpy.uint8 and cv2.countNonZero(cv2.inRange(image, 1, 254)) == 0
+
+
+def min_count(rank, size):
+    """Number of set pixels for the rank-th value of a size window to be set.
+
+    rank counts from the smallest value, or from the largest when negative,
+    like scipy's rank_filter.
+    """
+    if rank < 0:
+        rank += size
+    if not 0 <= rank < size:
+        raise ValueError('rank not within filter footprint size')
+    return size - rank
+
+
+def remove_lines(image, rank, kernel_size, out=None):
+    """Remove thin lines from a 0/255 image.
+
+    kernel_size is the (height, width) of the horizontal window, the vertical
+    window is its transpose. The windows are counted in two box filter passes
+    into one count image, each pass followed by its compare. The result goes
+    to out when it fits.
+    """
+    height, width = kernel_size
+    size = height * width
+    count = min_count(rank, size)
+    depth = cv2.CV_16U if size < 2 ** 16 else cv2.CV_32F
+
+    ones = numpy.greater(image, 0).view(numpy.uint8)
+    counts = cv2.boxFilter(ones, depth, (width, height), normalize=False, borderType=cv2.BORDER_REFLECT)
+    if out is None or out.shape != image.shape or out.dtype != numpy.uint8:
+        out = None
+    out = cv2.compare(counts, count, cv2.CMP_GE, dst=out)
+
+    # the horizontal counts are done with, the vertical ones reuse their image
+    counts = cv2.boxFilter(ones, depth, (height, width), dst=counts, normalize=False,
+                           borderType=cv2.BORDER_REFLECT)
+    # ones is free again, use it as the scratch buffer of the vertical test
+    cv2.compare(counts, count, cv2.CMP_GE, dst=ones)
+    cv2.bitwise_and(out, ones, dst=out)
+    return cv2.bitwise_and(out, image, dst=out)
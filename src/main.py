@@ -1,6 +1,10 @@
 import numpy as np
 import cv2
+import image_io
+import quad_detector
 import transform
+from debug_writer import DebugWriter
+from image_context import ImageContext
 
 
 def auto_canny(image, sigma=0.33):
@@ -16,45 +20,53 @@ def auto_canny(image, sigma=0.33):
     return edged
 
 
-image = cv2.imread('test2.png')
+image = image_io.read('test2.png')
 original = image.copy()
 
+# Intermediate images are written in the background
+writer = DebugWriter()
+debug = writer.run('.')
+
 ratio = 1
 
+# Products of the image such as gray and adaptive thresholds are computed
+# once, on first use
+context = ImageContext(original)
+
 # Gray
-image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-cv2.imwrite("gray.jpg", image)
+image = context.gray(cv2.COLOR_RGB2GRAY)
+debug.write("gray", image)
 
 # Text detection
 morphStructure = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
 image = cv2.morphologyEx(image, cv2.MORPH_GRADIENT, morphStructure)
-cv2.imwrite("gradient.jpg", image)
+debug.write("gradient", image)
 
 (_, image) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-cv2.imwrite("grandient-bin.jpg", image)
+debug.write("grandient-bin", image)
 #image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 251, 20)
-#cv2.imwrite("grandient-bin.jpg", image)
+#debug.write("grandient-bin", image)
 
 morphStructure = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1))
 image = cv2.morphologyEx(image, cv2.MORPH_CLOSE, morphStructure)
-cv2.imwrite("closed.jpg", image)
+debug.write("closed", image)
 
 # Blur
 image = cv2.GaussianBlur(image, (9, 9), 0)
-cv2.imwrite("blurred.jpg", image)
+debug.write("blurred", image)
 
 # Sharpen
 #kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
 #image = cv2.filter2D(image, -1, kernel)
-#cv2.imwrite("sharpened.jpg", image)
+#debug.write("sharpened", image)
 
 # Threshold
 image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 251, 20)
-cv2.imwrite("threshold.jpg", image)
+debug.write("threshold", image)
 
 # Binarize
 #(_, image) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-#cv2.imwrite("binary.jpg", image)
+#debug.write("binary", image)
 
 # Add borders
 row, col = image.shape[:2]
@@ -63,60 +75,40 @@ mean = cv2.mean(bottom)[0]
 
 bordersize = 10
 border = cv2.copyMakeBorder(image, bordersize, bordersize, bordersize, bordersize, cv2.BORDER_CONSTANT, value=[mean, mean, mean])
-cv2.imwrite("bordered.jpg", image)
+debug.write("bordered", image)
 
 # Canny
 #image = cv2.Canny(image, 75, 200)
-#cv2.imwrite("canny.jpg", image)
+#debug.write("canny", image)
 
 # Canny auto
 wide = cv2.Canny(image, 10, 200)
 tight = cv2.Canny(image, 225, 250)
 image = auto_canny(image)
-cv2.imwrite("canny.jpg", image)
+debug.write("canny", image)
 
-# Contours
-(_, cnts, _) = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:5]
+# Document outline
+quads = quad_detector.find_quads(image, scale=1.0 / ratio)
 
 outlined = original.copy()
+for quad in quads:
+    cv2.polylines(outlined, [quad.points.astype(np.int32)], True, (0, 0, 255), 2)
+debug.write("outlined", outlined)
+
+if quads:
+    image = transform.four_point_transform(original, quads[0].points)
+    debug.write("unwarped", image)
+    context = ImageContext(image)
 
-# loop over the contours
-contour = None
-screenCnt = None
-for c in cnts:
-    # approximate the contour
-    peri = cv2.arcLength(c, True)
-    approx = cv2.approxPolyDP(c, 0.01 * peri, True)
-    cv2.drawContours(outlined, [c], -1, (0, 0, 255), 2)
-
-    # if our approximated contour has four points, then we
-    # can assume that we have found our screen
-    if len(approx) == 4:
-        screenCnt = approx
-        contour = c
-        break
-
-
-# outline
-#cv2.drawContours(outlined, [contour], -1, (255, 0, 0), 1)
-#cv2.drawContours(outlined, [screenCnt], -1, (0, 255, 0), 1)
-cv2.imwrite("outlined.jpg", outlined)
-
-if screenCnt:
-    image = transform.four_point_transform(original, screenCnt.reshape(4, 2) * ratio)
-    cv2.imwrite("unwarped.jpg", image)
-else:
-    image = original
-
-image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 #image = threshold_adaptive(warped, 251, offset=10) # TODO test
 #image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 5, 8)
 #image = warped.astype("uint8") * 255
 
-#(_, image) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 251, 20)
-cv2.imwrite("binary2.jpg", image)
+#(_, image) = cv2.threshold(context.gray(), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+image = context.adaptive_threshold(251, 20)
+debug.write("binary2", image)
 
 
-cv2.imwrite("final.jpg", image)
+image_io.write("final.jpg", image)
+debug.finish(image)
+writer.close()
@@ -1,47 +1,29 @@
+import sys
+
 import imutils as imutils
 import numpy as np
 import cv2
 from skimage.filters import threshold_local
 
+import image_io
+import quad_detector
 import transform
 
-# load the image and compute the ratio of the old height
-# to the new height, clone it, and resize it
-image = cv2.imread('receipt2.jpg')
-ratio = image.shape[0] / 500.0
+# load the image and clone it
+image = image_io.read('receipt2.jpg')
 orig = image.copy()
-image = imutils.resize(image, height=500)
-
-# convert the image to grayscale, blur it, and find edges
-# in the image
-gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-gray = cv2.GaussianBlur(gray, (5, 5), 0)
-edged = cv2.Canny(gray, 75, 200)
-
-# find the contours in the edged image, keeping only the
-# largest ones, and initialize the screen contour
-cnts = cv2.findContours(edged.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-cnts = cnts[0] if imutils.is_cv2() else cnts[1]
-cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:5]
-
-# loop over the contours
-for c in cnts:
-    # approximate the contour
-    peri = cv2.arcLength(c, True)
-    approx = cv2.approxPolyDP(c, 0.02 * peri, True)
-
-    # if our approximated contour has four points, then we
-    # can assume that we have found our screen
-    if len(approx) == 4:
-        screenCnt = approx
-        break
 
-# show the contour (outline) of the piece of paper
+# find the outline of the piece of paper, on a copy of the image
+# resized to 500 pixels, and map it back to the original
+quads = quad_detector.detect_quads(image, max_dim=500)
 print("STEP 2: Find contours of paper")
+if not quads:
+    print("No document found")
+    sys.exit(1)
 
 # apply the four point transform to obtain a top-down
 # view of the original image
-warped = transform.four_point_transform(orig, screenCnt.reshape(4, 2) * ratio)
+warped = transform.four_point_transform(orig, quads[0].points)
 
 # convert the warped image to grayscale, then threshold it
 # to give it that 'black and white' paper effect
@@ -51,4 +33,4 @@ warped = transform.four_point_transform(orig, screenCnt.reshape(4, 2) * ratio)
 
 # show the original and scanned images
 print("STEP 3: Apply perspective transform")
-cv2.imwrite("result.jpg", imutils.resize(warped, height=650))
+image_io.write("result.jpg", imutils.resize(warped, height=650))
@@ -0,0 +1,144 @@
+"""Morphology with large rectangular kernels.
+
+A rectangular kernel is separable, so dilation and erosion are done as one
+running max/min pass per axis. Each pass uses the van Herk/Gil-Werman
+algorithm: the line is split in blocks of the kernel length, and the result is
+the max/min of a suffix scan and a prefix scan over the blocks, which costs a
+constant number of comparisons per pixel whatever the kernel size. The scans
+run along the first axis, where every step is a vectorized operation over whole
+rows, so horizontal passes work on a transposed copy.
+
+Kernel sizes are (width, height) and anchors are centered, as with
+cv2.getStructuringElement, and the results match cv2.dilate, cv2.erode and
+cv2.morphologyEx with their default border. Like OpenCV's dst, an out array
+of the right shape and dtype receives the result.
+"""
+import numpy
+
+# from these kernel sizes on the running passes are faster than OpenCV's own,
+# measured on a 3000x2250 uint8 image with one thread: about 85 pixels for a
+# close and 135 for a dilation. A close has twice the scans of a dilation but
+# the same two transposes, so it wins sooner. Below them OpenCV is up to twice
+# as fast.
+LARGE_CLOSE = 100
+LARGE_KERNEL = 140
+
+
+def is_large(kernel_size, close=False):
+    """Whether the running passes are faster than OpenCV for a kernel_size
+    dilation or erosion, or with close a closing."""
+    return max(kernel_size) >= (LARGE_CLOSE if close else LARGE_KERNEL)
+
+
+def _extreme(dtype, op):
+    if dtype == numpy.bool_:
+        return op is numpy.maximum
+    if numpy.issubdtype(dtype, numpy.integer):
+        info = numpy.iinfo(dtype)
+    else:
+        info = numpy.finfo(dtype)
+    return info.max if op is numpy.maximum else info.min
+
+
+def _fits(out, shape, dtype):
+    return out is not None and out.shape == shape and out.dtype == dtype
+
+
+def _transpose(image, out=None):
+    transposed = numpy.swapaxes(image, 0, 1)
+    if not _fits(out, transposed.shape, transposed.dtype):
+        return numpy.ascontiguousarray(transposed)
+    numpy.copyto(out, transposed)
+    return out
+
+
+def _running(image, size, op, fill, before, after, out=None):
+    """Apply op over a sliding window of size rows.
+
+    The image is padded with fill by before/after rows (a negative amount crops
+    it instead) and the result has one row per full window, so output row i
+    covers padded rows i..i + size - 1. The result goes to out if it fits.
+    """
+    if size == 1 and before == 0 and after == 0:
+        return image
+
+    n = image.shape[0]
+    rest = image.shape[1:]
+    length = n + before + after
+    blocks = -(-length // size)
+
+    padded = numpy.empty((blocks * size,) + rest, dtype=image.dtype)
+    src_start, src_stop = max(0, -before), n - max(0, -after)
+    dst_start = max(0, before)
+    dst_stop = dst_start + src_stop - src_start
+    padded[:dst_start] = fill
+    padded[dst_start:dst_stop] = image[src_start:src_stop]
+    padded[dst_stop:] = fill
+    padded = padded.reshape((blocks, size) + rest)
+
+    suffix = numpy.empty_like(padded)
+    suffix[:, size - 1] = padded[:, size - 1]
+    for j in range(size - 2, -1, -1):
+        op(suffix[:, j + 1], padded[:, j], out=suffix[:, j])
+
+    prefix = padded
+    for j in range(1, size):
+        op(prefix[:, j - 1], prefix[:, j], out=prefix[:, j])
+
+    count = length - size + 1
+    suffix = suffix.reshape((blocks * size,) + rest)
+    prefix = prefix.reshape((blocks * size,) + rest)
+    if not _fits(out, (count,) + rest, image.dtype):
+        out = suffix[:count]
+    op(suffix[:count], prefix[size - 1:size - 1 + count], out=out)
+    return out
+
+
+def _pad(size, extend):
+    """Rows needed before/after the image for a centered window of size.
+
+    With extend the result also covers the rows outside the image that a
+    second centered window of the same size reads.
+    """
+    anchor = size // 2
+    scale = 2 if extend else 1
+    return scale * anchor, scale * (size - 1 - anchor)
+
+
+def _morph(image, kernel_size, op, fill, extend=False, out=None):
+    width, height = kernel_size
+    image = _running(image, height, op, fill, *_pad(height, extend))
+    image = _running(_transpose(image), width, op, fill, *_pad(width, extend))
+    return _transpose(image, out)
+
+
+def rect_dilate(image, kernel_size, out=None):
+    """Dilate with a kernel_size (width, height) rectangle."""
+    return _morph(image, kernel_size, numpy.maximum, _extreme(image.dtype, numpy.minimum), out=out)
+
+
+def rect_erode(image, kernel_size, out=None):
+    """Erode with a kernel_size (width, height) rectangle."""
+    return _morph(image, kernel_size, numpy.minimum, _extreme(image.dtype, numpy.maximum), out=out)
+
+
+def rect_close(image, kernel_size, zero_border=False, out=None):
+    """Close with a kernel_size (width, height) rectangle.
+
+    With zero_border the pixels outside the image are taken to be 0, which
+    gives the same result as padding the image with zeros by more than the
+    kernel size, closing, and cropping the padding again.
+    """
+    width, height = kernel_size
+    low = 0 if zero_border else _extreme(image.dtype, numpy.minimum)
+    high = _extreme(image.dtype, numpy.maximum)
+
+    # dilations commute, and so do erosions, so both horizontal passes run on
+    # the same transposed copy
+    image = _running(image, height, numpy.maximum, low, *_pad(height, zero_border))
+    image = _running(_transpose(image), width, numpy.maximum, low, *_pad(width, zero_border))
+    if zero_border:
+        image = _running(image, width, numpy.minimum, high, 0, 0)
+        return _running(_transpose(image), height, numpy.minimum, high, 0, 0, out)
+    image = _running(image, width, numpy.minimum, high, *_pad(width, False))
+    return _running(_transpose(image), height, numpy.minimum, high, *_pad(height, False), out=out)
@@ -0,0 +1,166 @@
+import functools
+import inspect
+
+import numpy
+
+from image_context import ImageContext
+
+
+class Step(object):
+    """A processor bound to the keyword parameters it is called with.
+
+    Processors take (original_image, image, **params) and return the new image.
+    A functools.partial is unwrapped so that the step keeps track of its name
+    and parameters. A processor with an out parameter writes its result to out
+    when it has the right shape and dtype, like OpenCV's dst, and one with a
+    context parameter gets the ImageContext of the original image.
+    """
+
+    def __init__(self, processor, **params):
+        if isinstance(processor, functools.partial):
+            if processor.args:
+                raise TypeError('%s: processor parameters must be passed by keyword' % processor.func.__name__)
+            params = dict(processor.keywords, **params)
+            processor = processor.func
+
+        self.processor = processor
+        self.params = params
+        self.name = getattr(processor, '__name__', repr(processor))
+
+        try:
+            signature = inspect.signature(processor)
+            signature.bind(None, None, **params)
+        except TypeError as e:
+            raise TypeError('%s: %s' % (self.name, e))
+        self.accepts_out = 'out' in signature.parameters and 'out' not in params
+        self.accepts_context = 'context' in signature.parameters and 'context' not in params
+
+    def __call__(self, original_image, image, out=None, context=None):
+        params = self.params
+        if out is not None:
+            params = dict(params, out=out)
+        if context is not None and self.accepts_context:
+            params = dict(params, context=context)
+        return self.processor(original_image, image, **params)
+
+    def __repr__(self):
+        params = ', '.join('%s=%r' % item for item in sorted(self.params.items()))
+        return '%s(%s)' % (self.name, params)
+
+
+class Hook(object):
+    """Base class for pipeline hooks, every method is optional."""
+
+    def before_run(self, original_image):
+        pass
+
+    def cache_hit(self, index, step, original_image, image):
+        """The run resumes from the cached output of step index, the steps up
+        to it don't run and get no before_step or after_step."""
+        pass
+
+    def before_step(self, index, step, original_image, image):
+        pass
+
+    def after_step(self, index, step, original_image, image):
+        pass
+
+    def after_run(self, image):
+        pass
+
+
+class Pipeline(object):
+    """An ordered chain of processor steps.
+
+    The pipeline is built once and can be run on any number of images. Hooks
+    passed to the constructor apply to every run, hooks passed to a run only
+    apply to that run.
+    """
+
+    def __init__(self, *steps, hooks=()):
+        self.steps = [step if isinstance(step, Step) else Step(step) for step in steps]
+        self.hooks = list(hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def __call__(self, original_image, image=None, hooks=(), cache=None, pool=None):
+        """Run every step on image, which defaults to the original image.
+
+        With a StageCache the run resumes after the deepest step whose output is
+        cached, and stores the output of every step it runs. The hooks get the
+        cached output through cache_hit.
+
+        With a BufferPool the steps that take an out parameter write to buffers
+        from the pool, once a run with the pool has shown the shape and dtype of
+        their output for the input they get. Every buffer is given back as soon as the next
+        step is done with it, so consecutive steps ping-pong between a couple of
+        buffers. The result may be a pool buffer, the caller can give it back
+        when done with it.
+
+        The steps that take a context parameter share one ImageContext of the
+        original image, made for the run.
+        """
+        hooks = self.hooks + list(hooks)
+        if image is None:
+            image = original_image
+
+        start = 0
+        keys = None
+        if cache is not None:
+            keys = cache.keys(self.steps, original_image, image)
+            for index in reversed(range(len(keys))):
+                cached = cache.load(keys[index])
+                if cached is not None:
+                    image = cached
+                    start = index + 1
+                    break
+
+        for hook in hooks:
+            hook.before_run(original_image)
+        if start:
+            for hook in hooks:
+                hook.cache_hit(start - 1, self.steps[start - 1], original_image, image)
+
+        context = ImageContext(original_image)
+        borrowed = None
+        for index in range(start, len(self.steps)):
+            step = self.steps[index]
+            for hook in hooks:
+                hook.before_step(index, step, original_image, image)
+
+            out = None
+            pooled = pool is not None and step.accepts_out and isinstance(image, numpy.ndarray)
+            if pooled:
+                geometry = (image.shape, image.dtype, original_image.shape)
+                output = pool.output_of(step, geometry)
+                if output is not None:
+                    out = pool.take(*output)
+            result = step(original_image, image, out, context)
+            if pooled and isinstance(result, numpy.ndarray):
+                pool.record_output(step, geometry, result)
+
+            if out is not None and result is not out:
+                pool.give(out)
+                out = None
+            if borrowed is not None and not numpy.may_share_memory(borrowed, result):
+                pool.give(borrowed)
+                borrowed = None
+            if out is not None:
+                borrowed = out
+            image = result
+
+            for hook in hooks:
+                hook.after_step(index, step, original_image, image)
+            if keys is not None:
+                cache.store(keys[index], image)
+
+        for hook in hooks:
+            hook.after_run(image)
+        return image
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return 'Pipeline(%s)' % ', '.join(repr(step) for step in self.steps)
@@ -1,7 +1,9 @@
 from .apply_mask import apply_mask
 from .approximate_contour import approximate_contour
+from .binarize_text import binarize_text
 from .canny import canny
 from .crop import crop
+from .deskew import deskew
 from .dilate import dilate
 from .expand import expand
 from .remove_background import remove_background
@@ -12,4 +14,5 @@ from .morph_gradient import morph_gradient
 from .otsu_threshold import otsu_threshold
 from .remove_lines import remove_lines
 from .remove_small_areas import remove_small_areas
+from .resize_to_original import resize_to_original
 from .sharpen import sharpen
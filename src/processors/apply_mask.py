@@ -1,9 +1,31 @@
 import numpy
 import cv2
+from image_context import ImageContext
 
+BLOCK_SIZE = 251
 
-def apply_mask(original_image, image):
-    gray = cv2.cvtColor(original_image, cv2.COLOR_RGB2GRAY)
-    threshold_image = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 251, 20)
-    threshold_image[image == 0] = 255
-    return threshold_image
+
+def apply_mask(original_image, image, out=None, context=None):
+    if context is None:
+        context = ImageContext(original_image)
+    gray = context.gray(cv2.COLOR_RGB2GRAY)
+
+    # the masked out pixels are set whatever the threshold, so it only runs on
+    # the bounding box of the mask, with the margin its blocks reach past it
+    new_image = cv2.compare(image, 0, cv2.CMP_EQ, dst=out)
+    rows = numpy.flatnonzero(cv2.reduce(image, 1, cv2.REDUCE_MAX))
+    cols = numpy.flatnonzero(cv2.reduce(image, 0, cv2.REDUCE_MAX))
+    if not len(rows):
+        return new_image
+
+    height, width = image.shape[:2]
+    margin = BLOCK_SIZE // 2
+    top, bottom = max(0, rows[0] - margin), min(height, rows[-1] + 1 + margin)
+    left, right = max(0, cols[0] - margin), min(width, cols[-1] + 1 + margin)
+    threshold_image = cv2.adaptiveThreshold(gray[top:bottom, left:right], 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                            cv2.THRESH_BINARY, BLOCK_SIZE, 20)
+
+    box = numpy.s_[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    inside = numpy.s_[rows[0] - top:rows[-1] + 1 - top, cols[0] - left:cols[-1] + 1 - left]
+    numpy.bitwise_or(new_image[box], threshold_image[inside], out=new_image[box])
+    return new_image
@@ -4,8 +4,8 @@ import transform
 
 
 def approximate_contour(_original_image, image):
-    hierarchy, contours, offset = cv2.findContours(image.astype(numpy.uint8), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    mask = numpy.zeros(image.shape).astype(numpy.uint8)
+    contours = cv2.findContours(image.astype(numpy.uint8, copy=False), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    mask = numpy.zeros(image.shape, dtype=numpy.uint8)
 
     for contour in contours:
         points = cv2.convexHull(contour)
@@ -25,4 +25,4 @@ def approximate_contour(_original_image, image):
     #gray = cv2.cvtColor(_original_image, cv2.COLOR_RGB2GRAY)
     #(_, image) = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
     #return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 251, 20)
-    return image.astype(numpy.uint8)
+    return image.astype(numpy.uint8, copy=False)
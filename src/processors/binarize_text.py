@@ -0,0 +1,174 @@
+# Text binarization based on the paper "Font and Background Color Independent Text Binarization" by
+# T Kasar, J Kumar and A G Ramakrishnan
+# http://www.m.cs.osakafu-u.ac.jp/cbdar2007/proceedings/papers/O1-1.pdf
+
+# Copyright (c) 2012, Jason Funk <jasonlfunk@gmail.com>
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+# and associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NON-INFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import cv2
+import numpy
+
+
+def luminance(image):
+    """Pixel intensity of a BGR image.
+
+    Apparently human eyes register colors differently.
+    TVs use this formula to determine
+    pixel intensity = 0.30R + 0.59G + 0.11B
+    """
+    return 0.30 * image[:, :, 2] + 0.59 * image[:, :, 1] + 0.11 * image[:, :, 0]
+
+
+def sample(intensity, xs, ys):
+    """Intensity at the (xs, ys) pixels, 0 for pixels past the right or bottom edge."""
+    xs = numpy.asarray(xs)
+    ys = numpy.asarray(ys)
+    inside = (ys < intensity.shape[0]) & (xs < intensity.shape[1])
+    values = numpy.zeros(xs.shape)
+    values[inside] = intensity[ys[inside], xs[inside]]
+    return values
+
+
+class ContourTree(object):
+    """Index of the RETR_TREE hierarchy of the contours of an image.
+
+    Everything the text box filter needs is computed for all contours at once:
+    the bounding boxes, whether a contour is one we care about, the number of
+    those below it and the first of those above it. This makes include_box a
+    lookup instead of a walk of the hierarchy.
+    """
+
+    def __init__(self, contours, hierarchy, shape):
+        img_y, img_x = shape[:2]
+        count = len(contours)
+        lengths = numpy.array([len(contour) for contour in contours])
+        starts = numpy.concatenate([[0], numpy.cumsum(lengths)[:-1]])
+        points = numpy.concatenate([contour.reshape(-1, 2) for contour in contours])
+
+        x1 = numpy.minimum.reduceat(points[:, 0], starts)
+        y1 = numpy.minimum.reduceat(points[:, 1], starts)
+        w = numpy.maximum.reduceat(points[:, 0], starts) - x1 + 1
+        h = numpy.maximum.reduceat(points[:, 1], starts) - y1 + 1
+        self.boxes = numpy.stack([x1, y1, w, h], axis=1)
+
+        # A contour we care about has a character shaped box, not too oblong
+        # or tall and not too big or small, and is a connected shape
+        ratio = w / h
+        area = (w * h).astype(float)
+        keep_box = (ratio >= 0.1) & (ratio <= 10) & (area <= (img_x * img_y) / 5) & (area >= 15)
+        first = points[starts]
+        last = points[starts + lengths - 1]
+        connected = numpy.all(numpy.abs(first - last) <= 1, axis=1)
+        self.keep = keep_box & connected
+
+        # Depth of every contour, top-level contours are at depth 0
+        parent = hierarchy[:, 3]
+        depth = numpy.zeros(count, dtype=int)
+        ancestor = parent.copy()
+        while True:
+            below = ancestor >= 0
+            if not below.any():
+                break
+            depth[below] += 1
+            ancestor[below] = parent[ancestor[below]]
+        levels = [numpy.flatnonzero(depth == d) for d in range(depth.max() + 1)] if count else []
+
+        # Number of kept contours anywhere below each contour, bottom up
+        self.kept_children = numpy.zeros(count, dtype=int)
+        for nodes in reversed(levels[1:]):
+            numpy.add.at(self.kept_children, parent[nodes], self.kept_children[nodes] + self.keep[nodes])
+
+        # First kept contour at or above each contour, top down. Like the
+        # original walk this stops at contour 0, kept or not.
+        kept_self = numpy.arange(count)
+        for nodes in levels:
+            nodes = nodes[~self.keep[nodes] & (nodes > 0)]
+            kept_self[nodes] = numpy.where(parent[nodes] >= 0, kept_self[parent[nodes]], -1)
+        self.kept_parent = numpy.where(parent >= 0, kept_self[parent], -1)
+
+    def include_box(self, index):
+        # skip the interior of a letter
+        parent = self.kept_parent[index]
+        if parent > 0 and self.kept_children[parent] <= 2:
+            return False
+
+        # skip a container of letters
+        return self.kept_children[index] <= 2
+
+    def included(self):
+        """Indices of the kept contours that pass include_box."""
+        parent = self.kept_parent
+        interior = (parent > 0) & (self.kept_children[parent] <= 2)
+        return numpy.flatnonzero(self.keep & ~interior & (self.kept_children <= 2))
+
+
+def binarize_text(_original_image, image, border_size=50):
+    """Binarize the characters of a BGR image, dark text on a white background.
+
+    The image gets a border of border_size pixels for processing sake, which is
+    kept in the result.
+    """
+    # Add a border to the image for processing sake
+    img = cv2.copyMakeBorder(image, border_size, border_size, border_size, border_size, cv2.BORDER_CONSTANT)
+    intensity = luminance(img)
+
+    # Run canny edge detection on each channel and join the edges back
+    blue, green, red = cv2.split(img)
+    edges = cv2.Canny(blue, 200, 250) | cv2.Canny(green, 200, 250) | cv2.Canny(red, 200, 250)
+
+    contours, hierarchy = cv2.findContours(edges.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)[-2:]
+
+    # Make a white copy of our image
+    new_image = edges.copy()
+    new_image.fill(255)
+
+    if hierarchy is not None:
+        tree = ContourTree(contours, hierarchy[0], img.shape)
+
+        # For each box, find the foreground and background intensities
+        for index in tree.included():
+            contour = contours[index]
+            x_, y_, width, height = tree.boxes[index]
+
+            # The foreground intensity is the average intensity of the edge pixels,
+            # summed in contour order
+            points = contour.reshape(-1, 2)
+            fg_int = numpy.cumsum(sample(intensity, points[:, 0], points[:, 1]))[-1] / len(contour)
+
+            # The background intensity is the median of three pixels going around the
+            # outside of each corner of the bounding box
+            bg_xs = [x_ - 1, x_ - 1, x_,
+                     x_ + width + 1, x_ + width, x_ + width + 1,
+                     x_ - 1, x_ - 1, x_,
+                     x_ + width + 1, x_ + width, x_ + width + 1]
+            bg_ys = [y_ - 1, y_, y_ - 1,
+                     y_ - 1, y_ - 1, y_,
+                     y_ + height + 1, y_ + height, y_ + height + 1,
+                     y_ + height + 1, y_ + height + 1, y_ + height]
+            bg_int = numpy.median(sample(intensity, bg_xs, bg_ys))
+
+            # Determine if the box should be inverted
+            if fg_int >= bg_int:
+                fg, bg = 255, 0
+            else:
+                fg, bg = 0, 255
+
+            # Color the pixels of the box, slicing clips it to the image
+            box = numpy.s_[y_:y_ + height, x_:x_ + width]
+            new_image[box] = numpy.where(intensity[box] > fg_int, bg, fg)
+
+    # blur a bit to improve ocr accuracy
+    return cv2.blur(new_image, (2, 2))
@@ -0,0 +1,13 @@
+import skew
+
+
+def deskew(_original_image, image, max_angle=15.0, min_angle=0.1, border_value=255):
+    """Rotate an image of text so that its lines are horizontal.
+
+    Skews within max_angle degrees are corrected, below min_angle the image is
+    left as it is. The corners uncovered by the rotation get border_value.
+    """
+    angle, _ = skew.estimate(image, max_angle)
+    if abs(angle) < min_angle:
+        return image
+    return skew.rotate(image, -angle, border_value)
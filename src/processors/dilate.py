@@ -1,6 +1,9 @@
 import cv2
+import morphology
 
 
-def dilate(_original_image, image, kernel_size):
+def dilate(_original_image, image, kernel_size, out=None):
+    if morphology.is_large(kernel_size):
+        return morphology.rect_dilate(image, kernel_size, out=out)
     morph_structure = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
-    return cv2.dilate(image, morph_structure)
+    return cv2.dilate(image, morph_structure, dst=out)
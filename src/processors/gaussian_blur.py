@@ -1,5 +1,5 @@
 import cv2
 
 
-def gaussian_blur(_original_image, image, kernel_size):
-    return cv2.GaussianBlur(image, kernel_size, 0)
+def gaussian_blur(_original_image, image, kernel_size, out=None):
+    return cv2.GaussianBlur(image, kernel_size, 0, dst=out)
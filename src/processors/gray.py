@@ -2,5 +2,5 @@ import numpy
 import cv2
 
 
-def gray(_original_image, image):
-    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+def gray(_original_image, image, out=None):
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=out)
@@ -1,6 +1,11 @@
 import cv2
+import morphology
 
 
-def morph_close(_original_image, image, kernel_size):
+def morph_close(_original_image, image, kernel_size, zero_border=False, out=None):
+    # zero_border treats the outside of the image as 0, like an expand before and
+    # a crop after the close, without the padded copies
+    if zero_border or morphology.is_large(kernel_size, close=True):
+        return morphology.rect_close(image, kernel_size, zero_border, out=out)
     morph_structure = cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
-    return cv2.morphologyEx(image, cv2.MORPH_CLOSE, morph_structure)
+    return cv2.morphologyEx(image, cv2.MORPH_CLOSE, morph_structure, dst=out)
@@ -1,6 +1,6 @@
 import cv2
 
 
-def otsu_threshold(_original_image, image):
-    (_, new_image) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+def otsu_threshold(_original_image, image, out=None):
+    (_, new_image) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=out)
     return new_image
@@ -15,13 +15,13 @@ def find_border_components(contours, edges):
 
 def remove_outside_contour(contour, image):
     """Remove everything outside a border contour."""
-    new_image = numpy.zeros(image.shape)
+    new_image = numpy.zeros(image.shape, dtype=numpy.uint8)
     rectangle = cv2.minAreaRect(contour)
     if angle_from_right(rectangle[2]) <= 10.0:
         points = cv2.convexHull(contour)
         cv2.drawContours(new_image, [points], 0, 255, -1)
         cv2.drawContours(new_image, [points], 0, 0, 10)
-        return numpy.minimum(new_image, image)
+        return numpy.minimum(new_image, image, out=new_image)
     else:
         return image
 
@@ -34,16 +34,16 @@ def angle_from_right(deg):
     return min(deg % 90, 90 - (deg % 90))
 
 
-def remove_background(_original_image, image):
+def remove_background(_original_image, image, out=None):
     # TODO: dilate image _before_ finding a border. This is crazy sensitive!
-    hierarchy, contours, offset = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contours = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2]
     borders = find_border_components(contours, image)
     borders.sort(key=star(lambda i, x1, y1, x2, y2: (x2 - x1) * (y2 - y1)))
 
     if len(borders):
         border_contour = contours[borders[0][0]]
         edges = remove_outside_contour(border_contour, image)
-        return 255 * (edges > 0).astype(numpy.uint8)
+        return cv2.compare(edges, 0, cv2.CMP_GT, dst=out)
         #peri = cv2.arcLength(border_contour, True)
         #approx = cv2.approxPolyDP(border_contour, 0.02 * peri, True)
         #return transform.four_point_transform(_original_image, approx.reshape(4, 2))
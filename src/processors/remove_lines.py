@@ -1,8 +1,16 @@
 import numpy
 from scipy.ndimage.filters import rank_filter
+import lines
 
 
-def remove_lines(_original_image, image, rank, kernel_size):
-    maxed_rows = rank_filter(image, rank, size=(kernel_size[0], kernel_size[1]))
+def remove_lines(_original_image, image, rank, kernel_size, out=None):
+    # edge maps are 0/255, where the rank filters reduce to counting set pixels
+    if lines.is_binary(image):
+        return lines.remove_lines(image, rank, kernel_size, out=out)
+
+    if out is None or out.shape != image.shape or out.dtype != image.dtype:
+        out = None
+    maxed_rows = rank_filter(image, rank, size=(kernel_size[0], kernel_size[1]), output=out)
     maxed_cols = rank_filter(image, rank, size=(kernel_size[1], kernel_size[0]))
-    return numpy.minimum(numpy.minimum(image, maxed_rows), maxed_cols)
+    numpy.minimum(maxed_rows, maxed_cols, out=maxed_rows)
+    return numpy.minimum(image, maxed_rows, out=maxed_rows)
@@ -2,11 +2,15 @@ import cv2
 import numpy
 
 
-def remove_small_areas(_original_image, image, size):
-    (_, contours, _) = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+def remove_small_areas(_original_image, image, size, out=None):
+    contours = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2]
 
     kept_contours = []
-    new_image = numpy.zeros(image.shape)
+    if out is not None and out.shape == image.shape and out.dtype == numpy.uint8:
+        new_image = out
+        new_image.fill(0)
+    else:
+        new_image = numpy.zeros(image.shape, dtype=numpy.uint8)
     for contour in contours:
         area = cv2.contourArea(contour)
         if area > size:
@@ -0,0 +1,11 @@
+import cv2
+
+
+def resize_to_original(original_image, image, out=None):
+    """Scale a mask computed on a downscaled copy back up to the original size."""
+    height, width = original_image.shape[:2]
+    if image.shape[:2] == (height, width):
+        return image
+    resized = cv2.resize(image, (width, height), dst=out, interpolation=cv2.INTER_LINEAR)
+    cv2.threshold(resized, 127, 255, cv2.THRESH_BINARY, dst=resized)
+    return resized
@@ -0,0 +1,108 @@
+"""Find the outline of a document as a ranked list of quads.
+
+Only the largest contours can be the document, so they are selected with a
+partial sort, and most of them are culled by area and convexity before the
+polygon approximation. The approximation tries increasing tolerances until a
+contour simplifies to a convex 4-gon. Every quad gets a confidence score, and
+the quads are ranked by confidence times the part of the frame they cover.
+"""
+import collections
+
+import cv2
+import numpy
+
+import transform
+
+# points is a (4, 2) float32 array ordered top-left, top-right, bottom-right,
+# bottom-left, confidence in 0..1, coverage the fraction of the frame covered
+Quad = collections.namedtuple('Quad', ['points', 'confidence', 'coverage'])
+
+
+def corner_regularity(points):
+    """1 for right angles at every corner, down to 0 for a degenerate quad."""
+    edges = numpy.roll(points, -1, axis=0) - points
+    lengths = numpy.linalg.norm(edges, axis=1)
+    if numpy.any(lengths == 0):
+        return 0.0
+    edges = edges / lengths[:, numpy.newaxis]
+    cosines = numpy.abs(numpy.sum(edges * numpy.roll(edges, 1, axis=0), axis=1))
+    return float(1 - cosines.max())
+
+
+def approximate_quad(contour, epsilons):
+    """The first convex 4-gon contour simplifies to, trying every epsilon in
+    turn as a fraction of its perimeter, or None."""
+    perimeter = cv2.arcLength(contour, True)
+    for epsilon in epsilons:
+        approx = cv2.approxPolyDP(contour, epsilon * perimeter, True)
+        if len(approx) < 4:
+            # larger tolerances only simplify further
+            return None
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            return approx.reshape(4, 2)
+    return None
+
+
+def find_quads(edges, top_k=5, min_area=0.05, min_solidity=0.85, epsilons=(0.01, 0.02, 0.03, 0.05),
+               limit=None, scale=1.0):
+    """Find document quads in an edge image.
+
+    Only the top_k contours by area are considered, among those covering at
+    least min_area of the frame and filling at least min_solidity of their
+    convex hull. The search stops after limit quads. Points are divided by
+    scale, to map quads found on a downscaled frame back to the original.
+
+    Returns the quads ranked best first.
+    """
+    contours = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    frame_area = float(edges.shape[0] * edges.shape[1])
+    if not contours:
+        return []
+
+    areas = numpy.array([cv2.contourArea(contour) for contour in contours])
+    candidates = numpy.flatnonzero(areas >= min_area * frame_area)
+    if len(candidates) > top_k:
+        candidates = candidates[numpy.argpartition(-areas[candidates], top_k - 1)[:top_k]]
+    candidates = candidates[numpy.argsort(-areas[candidates])]
+
+    quads = []
+    for index in candidates:
+        contour = contours[index]
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        if hull_area == 0 or areas[index] / hull_area < min_solidity:
+            continue
+
+        points = approximate_quad(contour, epsilons)
+        if points is None:
+            continue
+
+        points = transform.order_points(points.astype(numpy.float32))
+        quad_area = cv2.contourArea(points)
+        fit = min(areas[index], quad_area) / max(areas[index], quad_area)
+        quads.append(Quad(points / scale, fit * corner_regularity(points), quad_area / frame_area))
+        if limit is not None and len(quads) >= limit:
+            break
+
+    quads.sort(key=lambda quad: -quad.confidence * quad.coverage)
+    return quads
+
+
+def detect_quads(image, max_dim=500, **options):
+    """Find document quads in a photo, working on a copy downscaled to max_dim.
+
+    The options are those of find_quads, the quads are in the coordinates of
+    image.
+    """
+    scale = min(1.0, float(max_dim) / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    # convert the image to grayscale, blur it, and find edges
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+    edges = cv2.Canny(image, 75, 200)
+
+    # close small gaps in the outline
+    edges = cv2.dilate(edges, numpy.ones((3, 3), dtype=numpy.uint8))
+    return find_quads(edges, scale=scale, **options)
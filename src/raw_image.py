@@ -0,0 +1,191 @@
+"""A raw on-disk format for pipeline intermediates.
+
+A .raw file is a 64 byte header followed by the pixels as they are in memory,
+so it is written without encoding and opened with numpy.memmap without
+decoding or copying. Binary masks, uint8 images of only 0 and 255 or bool
+images, are bit-packed instead: every row is stored as 1 bit per pixel, eight
+times smaller than the uint8 pixels, and unpacked when it is read.
+
+The header holds the magic, a format version, whether the payload is packed,
+the dtype and the shape of the image, which can have up to 4 dimensions.
+"""
+import collections
+import collections.abc
+import os
+import re
+import struct
+
+import numpy
+
+import lines
+
+MAGIC = b'\x93RAW'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBx8s4Q')
+HEADER_SIZE = 64
+EXTENSION = '.raw'
+
+Header = collections.namedtuple('Header', ['shape', 'dtype', 'packed'])
+
+
+def _natural_key(name):
+    # step_2 before step_10
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def is_mask(image):
+    if image.ndim != 2 or image.size == 0:
+        return False
+    return image.dtype == numpy.bool_ or lines.is_binary(image)
+
+
+def header_bytes(image, packed):
+    if image.ndim > 4:
+        raise ValueError('raw images have at most 4 dimensions, not %d' % image.ndim)
+    shape = tuple(image.shape) + (0,) * (4 - image.ndim)
+    header = HEADER.pack(MAGIC, VERSION, packed, image.ndim, image.dtype.str.encode(), *shape)
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+def parse_header(data):
+    """The Header of the raw image whose bytes start with data."""
+    if len(data) < HEADER_SIZE:
+        raise ValueError('not a raw image, the header is truncated')
+    magic, version, packed, ndim, dtype, *shape = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('not a raw image')
+    if version != VERSION:
+        raise ValueError('unsupported raw image version %d' % version)
+    return Header(tuple(shape[:ndim]), numpy.dtype(dtype.rstrip(b'\0').decode()), bool(packed))
+
+
+def payload_layout(header):
+    """The (shape, dtype) of the payload of header."""
+    if header.packed:
+        height, width = header.shape
+        return (height, (width + 7) // 8), numpy.dtype(numpy.uint8)
+    return header.shape, header.dtype
+
+
+def payload(image, pack=None):
+    """The payload of image and whether it is packed.
+
+    pack defaults to packing binary masks.
+    """
+    if pack is None:
+        pack = is_mask(image)
+    if pack:
+        if not is_mask(image):
+            raise ValueError('only binary masks can be packed')
+        return numpy.packbits(image, axis=1), True
+    return numpy.ascontiguousarray(image), False
+
+
+def unpack(packed, header):
+    """The image of a packed payload, or some of its rows."""
+    image = numpy.unpackbits(packed, axis=1, count=header.shape[1])
+    if header.dtype == numpy.bool_:
+        return image.view(numpy.bool_)
+    return numpy.multiply(image, 255, out=image)
+
+
+def dumps(image, pack=None):
+    """Encode image as the bytes of a raw file."""
+    data, packed = payload(image, pack)
+    return header_bytes(image, packed) + data.tobytes()
+
+
+def loads(data):
+    """Decode the bytes of a raw file, an unpacked image shares data."""
+    header = parse_header(data)
+    shape, dtype = payload_layout(header)
+    image = numpy.frombuffer(data, dtype=dtype, count=int(numpy.prod(shape)), offset=HEADER_SIZE)
+    image = image.reshape(shape)
+    return unpack(image, header) if header.packed else image
+
+
+def save(path, image, pack=None):
+    data, packed = payload(image, pack)
+    with open(path, 'wb') as f:
+        f.write(header_bytes(image, packed))
+        data.tofile(f)
+
+
+def load(path, mode='r'):
+    """Open the raw file at path.
+
+    An unpacked image is memory-mapped with mode, like numpy.memmap, a packed
+    one is read and unpacked.
+    """
+    return RawImage(path, mode).read()
+
+
+class RawImage(object):
+    """A raw file, with its payload memory-mapped.
+
+    The header is read when it is opened, the pixels only when they are used.
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.header = parse_header(f.read(HEADER_SIZE))
+        shape, dtype = payload_layout(self.header)
+        if 0 in shape:
+            # empty files can't be mapped
+            self.payload = numpy.empty(shape, dtype=dtype)
+        else:
+            self.payload = numpy.memmap(path, dtype=dtype, mode=mode, offset=HEADER_SIZE, shape=shape)
+
+    @property
+    def shape(self):
+        return self.header.shape
+
+    @property
+    def dtype(self):
+        return self.header.dtype
+
+    def rows(self, start, stop):
+        """Rows start to stop of the image, only those are read."""
+        if self.header.packed:
+            return unpack(self.payload[start:stop], self.header)
+        return self.payload[start:stop]
+
+    def read(self):
+        """The whole image, memory-mapped unless it is packed."""
+        return self.rows(0, self.shape[0]) if self.header.packed else self.payload
+
+    def __repr__(self):
+        return 'RawImage(%r, shape=%r, dtype=%s, packed=%r)' % (
+            self.path, self.shape, self.dtype, self.header.packed)
+
+
+class RunArtifacts(collections.abc.Mapping):
+    """The raw artifacts a debug run wrote to a folder, by name.
+
+    The folder is listed when it is opened, a file is opened on first access
+    and its pixels are mapped, not read, so a whole run opens at once.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.names = sorted((os.path.splitext(name)[0] for name in os.listdir(folder)
+                             if name.endswith(EXTENSION)), key=_natural_key)
+        self._opened = {}
+
+    def open(self, name):
+        """The RawImage of an artifact."""
+        if name not in self._opened:
+            if name not in self.names:
+                raise KeyError(name)
+            self._opened[name] = RawImage(os.path.join(self.folder, name + EXTENSION))
+        return self._opened[name]
+
+    def __getitem__(self, name):
+        return self.open(name).read()
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,126 @@
+"""Estimate the skew and line spacing of an image of text.
+
+The image is downscaled and binarized, and the ink pixels are projected on
+the normal of a candidate line direction. When the direction matches the text
+lines the projection profile alternates sharply between lines and the gaps
+between them, which gives it the largest sum of squares. Candidate angles are
+searched coarse to fine within a narrow window, and the line spacing is the
+period of the best profile, found from its autocorrelation.
+"""
+import cv2
+import numpy
+
+WORKING_DIM = 800
+
+
+def ink_points(image, max_dim=WORKING_DIM):
+    """Coordinates of the dark pixels of image, downscaled to max_dim.
+
+    Returns the (x, y) float arrays and the scale of the downscaled image.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = min(1.0, float(max_dim) / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    (_, ink) = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ys, xs = numpy.nonzero(ink)
+    return xs.astype(numpy.float64), ys.astype(numpy.float64), scale
+
+
+def profile(xs, ys, angle):
+    """Projection profile of the points for text lines at angle degrees.
+
+    Angles are counterclockwise, the profile runs along the normal of the
+    lines in one pixel bins.
+    """
+    theta = numpy.deg2rad(angle)
+    offsets = xs * numpy.sin(theta) + ys * numpy.cos(theta)
+    bins = numpy.floor(offsets - offsets.min()).astype(numpy.intp)
+    return numpy.bincount(bins).astype(numpy.float64)
+
+
+def score(xs, ys, angle):
+    counts = profile(xs, ys, angle)
+    return numpy.dot(counts, counts)
+
+
+def refine_peak(values, index):
+    """Parabolic interpolation of a peak at index, as a fractional index."""
+    if index <= 0 or index >= len(values) - 1:
+        return float(index)
+    left, center, right = values[index - 1], values[index], values[index + 1]
+    denominator = left - 2 * center + right
+    if denominator == 0:
+        return float(index)
+    return index + 0.5 * (left - right) / denominator
+
+
+def search_angle(xs, ys, max_angle=15.0, steps=(1.0, 0.1)):
+    """Angle of the text lines, searched at every step size in turn.
+
+    The first search covers -max_angle..max_angle, every next one covers a
+    step of the previous size around the best angle so far.
+    """
+    best, width = 0.0, max_angle
+    for step in steps:
+        angles = best + numpy.arange(-width, width + step / 2, step)
+        scores = numpy.array([score(xs, ys, angle) for angle in angles])
+        index = int(numpy.argmax(scores))
+        best = angles[0] + refine_peak(scores, index) * step
+        width = step
+    return float(best)
+
+
+def line_spacing(counts, min_spacing=2):
+    """Period of a projection profile in bins, or None without lines.
+
+    The autocorrelation of a profile of regular lines peaks at multiples of
+    the spacing. Past its first minimum the first peak at least half as high
+    as the highest one is taken, as blocks of text add peaks further out.
+    """
+    counts = counts - counts.mean()
+    n = len(counts)
+    if n < 2 * min_spacing + 1 or not counts.any():
+        return None
+    correlation = numpy.correlate(counts, counts, 'full')[n - 1:]
+    half = correlation[:n // 2]
+    minimum = int(numpy.argmax(numpy.diff(half) > 0)) if len(half) > 1 else 0
+    start = max(minimum, min_spacing)
+    if start >= len(half):
+        return None
+    rest = half[start:]
+    highest = rest.max()
+    if highest <= 0:
+        return None
+    peaks = numpy.flatnonzero((rest[1:-1] >= rest[:-2]) & (rest[1:-1] >= rest[2:]) & (rest[1:-1] >= highest / 2))
+    peak = start + (int(peaks[0]) + 1 if len(peaks) else int(numpy.argmax(rest)))
+    return refine_peak(half, peak)
+
+
+def estimate(image, max_angle=15.0, steps=(1.0, 0.1), max_dim=WORKING_DIM):
+    """Estimate the skew and line spacing of an image of text.
+
+    Returns (angle, spacing): the angle of the text lines in degrees,
+    counterclockwise, and the distance between lines in pixels of image, or
+    None when no line spacing stands out. Rotating the image by -angle makes
+    the lines horizontal.
+    """
+    xs, ys, scale = ink_points(image, max_dim)
+    if len(xs) == 0:
+        return 0.0, None
+    angle = search_angle(xs, ys, max_angle, steps)
+    spacing = line_spacing(profile(xs, ys, angle))
+    if spacing is not None:
+        spacing = float(spacing) / scale
+    return angle, spacing
+
+
+def rotate(image, angle, border_value=255):
+    """Rotate image by angle degrees counterclockwise about its center, keeping its size."""
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+    if image.ndim == 3:
+        border_value = (border_value,) * image.shape[2]
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
@@ -0,0 +1,153 @@
+import functools
+import hashlib
+import inspect
+import os
+import sys
+
+import numpy
+
+import raw_image
+
+# the modules of this tree, whose source is part of the cache keys
+SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# once over max_bytes, entries are evicted until the folder is this much of
+# it, so that a full cache is not scanned again on the next store
+LOW_WATER = 0.75
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part)
+    return h
+
+
+def image_digest(image):
+    """Hash the shape, dtype and bytes of an image."""
+    image = numpy.ascontiguousarray(image)
+    return _digest(repr((image.shape, str(image.dtype))).encode(), memoryview(image).cast('B'))
+
+
+def _local_module(value):
+    """The module of value, or value itself if it is a module, when it is part of this tree."""
+    module = value if inspect.ismodule(value) else sys.modules.get(getattr(value, '__module__', None) or '')
+    path = getattr(module, '__file__', None)
+    if path and os.path.abspath(path).startswith(SOURCE_ROOT + os.sep):
+        return module
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def source_digest(processor):
+    """Hash the source of the module of processor and of the modules of this
+    tree it uses, directly or not, so that a code change changes the keys."""
+    module = _local_module(processor)
+    if module is None:
+        return b''
+
+    sources = {}
+    pending = [module]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in sources:
+            continue
+        with open(module.__file__, 'rb') as f:
+            sources[module.__name__] = f.read()
+        pending.extend(filter(None, map(_local_module, vars(module).values())))
+    return _digest(*(name.encode() + b'\0' + source for name, source in sorted(sources.items()))).digest()
+
+
+class StageCache(object):
+    """On-disk cache of pipeline intermediates.
+
+    The key of the output of step N hashes the input image together with the
+    (processor, params) chain of steps 1..N, so that a pipeline whose later
+    steps changed can resume from the deepest intermediate it still shares with
+    a previous run. The source of every processor and of the modules it uses is
+    part of its key, so a code change doesn't reuse stale intermediates.
+    Entries are stored as .raw files, with binary masks packed to 1 bit per
+    pixel, loaded memory-mapped, and evicted least recently used first once
+    the folder grows over max_bytes.
+
+    The folder is scanned when the cache is created and the bytes stored are
+    added to that, it is only scanned again to evict. Processes sharing a
+    folder only count each other's entries at a scan, so the folder can go
+    over max_bytes by what the others stored since.
+    """
+
+    def __init__(self, folder, max_bytes=2 * 1024 ** 3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.total = sum(size for _, size, _ in self._entries())
+
+    def keys(self, steps, original_image, image):
+        """Return the cache key of the output of every step."""
+        h = image_digest(original_image)
+        if image is not original_image:
+            h.update(image_digest(image).digest())
+
+        keys = []
+        for step in steps:
+            name = '%s.%s' % (getattr(step.processor, '__module__', ''), step.name)
+            params = repr(sorted(step.params.items()))
+            h = _digest(h.digest(), name.encode(), params.encode(), source_digest(step.processor))
+            keys.append(h.hexdigest())
+        return keys
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + raw_image.EXTENSION)
+
+    def load(self, key):
+        """Return the cached image for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            # copy-on-write, so processors that work in place can't corrupt the entry
+            image = raw_image.load(path, mode='c')
+            os.utime(path)
+        except (IOError, OSError, ValueError):
+            return None
+        return image
+
+    def store(self, key, image):
+        if not isinstance(image, numpy.ndarray) or image.dtype == object:
+            return
+
+        path = self._path(key)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        raw_image.save(tmp_path, image)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self.total += size
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every entry, least recently used first."""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(raw_image.EXTENSION):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Scan the folder and evict entries until it is LOW_WATER of max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.total = total
@@ -0,0 +1,164 @@
+"""Run the local steps of a pipeline tile by tile.
+
+A local step computes every output pixel from a window of input pixels around
+it: blurs, edge detection, morphology, rank filters and adaptive thresholds.
+Such a step can run on overlapping tiles, each read with a halo of the pixels
+its window reaches past the tile, and only the inside of every tile is kept.
+The temporaries of a step are then bounded by the tile size instead of the
+image size, and the input can be a memory-mapped image that is never read as a
+whole.
+
+The global steps, which find contours, run as usual on the uint8 frame the
+tiles of the previous step were stitched into. Steps that change the geometry
+of the image are global too.
+"""
+import os
+import tempfile
+
+import numpy
+
+import processors
+
+# Canny's hysteresis follows weak edges as far as they go, a tile only sees as
+# far as its halo, so a weak edge connected to a strong one only through
+# another tile may be lost
+CANNY_HALO = 32
+
+
+def _radius(kernel_size):
+    return max(kernel_size) // 2
+
+
+# processor -> halo of the tiles it runs on, from its parameters
+HALOS = {
+    processors.canny: lambda **params: CANNY_HALO,
+    processors.gray: lambda **params: 0,
+    processors.sharpen: lambda **params: 1,
+    processors.gaussian_blur: lambda kernel_size, **params: _radius(kernel_size),
+    processors.dilate: lambda kernel_size, **params: _radius(kernel_size),
+    processors.morph_gradient: lambda kernel_size, **params: _radius(kernel_size),
+    # a dilation then an erosion, each reading a radius further
+    processors.morph_close: lambda kernel_size, **params: 2 * _radius(kernel_size),
+    processors.remove_lines: lambda kernel_size, **params: _radius(kernel_size),
+    # the adaptive threshold of the original image with a 251 pixel block
+    processors.apply_mask: lambda **params: 251 // 2,
+}
+
+
+def histogram_median(histogram):
+    """The median of the values counted by a histogram, as numpy.median."""
+    counts = numpy.cumsum(histogram)
+    total = counts[-1]
+    upper = numpy.searchsorted(counts, total // 2, side='right')
+    if total % 2:
+        return float(upper)
+    lower = numpy.searchsorted(counts, total // 2 - 1, side='right')
+    return (lower + upper) / 2.0
+
+
+def canny_params(image, tile_size):
+    """The median of the whole image, counted tile by tile."""
+    histogram = numpy.zeros(256, dtype=numpy.int64)
+    for outer, _, _ in tiles(image.shape, tile_size, 0):
+        histogram += numpy.bincount(image[outer].ravel(), minlength=256)
+    return {'median': histogram_median(histogram)}
+
+
+# processor -> parameters computed from the whole image before it is tiled
+PREPARE = {
+    processors.canny: canny_params,
+}
+
+
+def step_halo(step):
+    """The halo of the tiles of a step, or None if the step is global."""
+    halo = HALOS.get(step.processor)
+    if halo is None:
+        return None
+    return halo(**step.params)
+
+
+def tiles(shape, tile_size, halo):
+    """Cover an image of shape with tiles of at most tile_size pixels a side.
+
+    Yields (outer, inner, crop) tuples of slices: outer is the tile with its
+    halo, clipped to the image, inner the part of the image the tile is for,
+    and crop the inner part within the outer one.
+    """
+    height, width = shape[:2]
+    for y in range(0, height, tile_size):
+        y_stop = min(y + tile_size, height)
+        top, bottom = max(0, y - halo), min(height, y_stop + halo)
+        for x in range(0, width, tile_size):
+            x_stop = min(x + tile_size, width)
+            left, right = max(0, x - halo), min(width, x_stop + halo)
+            yield (numpy.s_[top:bottom, left:right], numpy.s_[y:y_stop, x:x_stop],
+                   numpy.s_[y - top:y_stop - top, x - left:x_stop - left])
+
+
+class TiledRunner(object):
+    """Run pipelines with their local steps tile by tile.
+
+    The frames the tiles are stitched into are in memory, or with a folder
+    memory-mapped files in it, deleted when the frame is no longer used.
+    """
+
+    def __init__(self, tile_size=1024, folder=None):
+        self.tile_size = tile_size
+        self.folder = folder
+
+    def frame(self, shape, dtype):
+        if self.folder is None:
+            return numpy.empty(shape, dtype=dtype)
+        with tempfile.NamedTemporaryFile(dir=self.folder, suffix='.npy', delete=False) as f:
+            path = f.name
+        frame = numpy.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+        # the mapping keeps the file alive until the frame is collected
+        os.remove(path)
+        return frame
+
+    def run_step(self, step, original_image, image):
+        """Run a local step on image tile by tile and return the stitched frame."""
+        halo = step_halo(step)
+        prepare = PREPARE.get(step.processor)
+        params = dict(step.params, **prepare(image, self.tile_size)) if prepare else step.params
+
+        # the processors that use the original image run at its size
+        aligned = original_image.shape[:2] == image.shape[:2]
+        frame = None
+        for outer, inner, crop in tiles(image.shape, self.tile_size, halo):
+            tile = numpy.ascontiguousarray(image[outer])
+            original_tile = numpy.ascontiguousarray(original_image[outer]) if aligned else original_image
+            result = step.processor(original_tile, tile, **params)
+            if frame is None:
+                frame = self.frame(image.shape[:2] + result.shape[2:], result.dtype)
+            frame[inner] = result[crop]
+        return frame
+
+    def __call__(self, pipeline, original_image, image=None, hooks=()):
+        """Run every step of pipeline on image, which defaults to the original image.
+
+        Like calling the pipeline, without a stage cache or buffer pool.
+        """
+        hooks = pipeline.hooks + list(hooks)
+        if image is None:
+            image = original_image
+
+        for hook in hooks:
+            hook.before_run(original_image)
+
+        for index, step in enumerate(pipeline.steps):
+            for hook in hooks:
+                hook.before_step(index, step, original_image, image)
+
+            if step_halo(step) is None:
+                image = step(original_image, image)
+            else:
+                image = self.run_step(step, original_image, image)
+
+            for hook in hooks:
+                hook.after_step(index, step, original_image, image)
+
+        for hook in hooks:
+            hook.after_run(image)
+        return image
@@ -1,4 +1,5 @@
 # import the necessary packages
+import functools
 import numpy as np
 import cv2
 
@@ -6,59 +7,99 @@ def order_points(pts):
 	# initialzie a list of coordinates that will be ordered
 	# such that the first entry in the list is the top-left,
 	# the second entry is the top-right, the third is the
-	# bottom-right, and the fourth is the bottom-left
-	rect = np.zeros((4, 2), dtype = "float32")
+	# bottom-right, and the fourth is the bottom-left. pts is
+	# a single (4, 2) quad or a batch of (N, 4, 2) quads
+	pts = np.asarray(pts)
+	quads = pts.reshape(-1, 4, 2)
+	rect = np.zeros(quads.shape, dtype = "float32")
+	rows = np.arange(len(quads))
 
 	# the top-left point will have the smallest sum, whereas
 	# the bottom-right point will have the largest sum
-	s = pts.sum(axis = 1)
-	rect[0] = pts[np.argmin(s)]
-	rect[2] = pts[np.argmax(s)]
+	s = quads.sum(axis = 2)
+	rect[:, 0] = quads[rows, np.argmin(s, axis = 1)]
+	rect[:, 2] = quads[rows, np.argmax(s, axis = 1)]
 
 	# now, compute the difference between the points, the
 	# top-right point will have the smallest difference,
 	# whereas the bottom-left will have the largest difference
-	diff = np.diff(pts, axis = 1)
-	rect[1] = pts[np.argmin(diff)]
-	rect[3] = pts[np.argmax(diff)]
+	diff = np.diff(quads, axis = 2)[:, :, 0]
+	rect[:, 1] = quads[rows, np.argmin(diff, axis = 1)]
+	rect[:, 3] = quads[rows, np.argmax(diff, axis = 1)]
 
 	# return the ordered coordinates
-	return rect
+	return rect.reshape(pts.shape)
 
-def four_point_transform(image, pts):
-	# obtain a consistent order of the points and unpack them
-	# individually
-	rect = order_points(pts)
-	(tl, tr, br, bl) = rect
+def target_sizes(rects):
+	# compute the (width, height) of the new image of every
+	# ordered (N, 4, 2) quad: the width is the maximum distance
+	# between bottom-right and bottom-left or top-right and
+	# top-left, and the height the maximum distance between
+	# top-right and bottom-right or top-left and bottom-left
+	(tl, tr, br, bl) = np.moveaxis(rects, 1, 0)
+	width = np.maximum(np.linalg.norm(br - bl, axis = 1), np.linalg.norm(tr - tl, axis = 1))
+	height = np.maximum(np.linalg.norm(tr - br, axis = 1), np.linalg.norm(tl - bl, axis = 1))
+	return np.stack([width, height], axis = 1).astype(int)
+
+@functools.lru_cache(maxsize = 256)
+def destination(width, height):
+	# the destination points to obtain a "birds eye view",
+	# (i.e. top-down view) of the image, in the top-left,
+	# top-right, bottom-right, and bottom-left order
+	return np.array([
+		[0, 0],
+		[width - 1, 0],
+		[width - 1, height - 1],
+		[0, height - 1]], dtype = "float32")
 
-	# compute the width of the new image, which will be the
-	# maximum distance between bottom-right and bottom-left
-	# x-coordiates or the top-right and top-left x-coordinates
-	widthA = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2))
-	widthB = np.sqrt(((tr[0] - tl[0]) ** 2) + ((tr[1] - tl[1]) ** 2))
-	maxWidth = max(int(widthA), int(widthB))
+@functools.lru_cache(maxsize = 256)
+def _homography(rect, width, height):
+	rect = np.frombuffer(rect, dtype = "float32").reshape(4, 2)
+	return cv2.getPerspectiveTransform(rect, destination(width, height))
 
-	# compute the height of the new image, which will be the
-	# maximum distance between the top-right and bottom-right
-	# y-coordinates or the top-left and bottom-left y-coordinates
-	heightA = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
-	heightB = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
-	maxHeight = max(int(heightA), int(heightB))
+class Warp(object):
+	# the perspective transform of one ordered quad to a
+	# (width, height) image, which can be applied to any
+	# number of images of the same scene (original, gray,
+	# mask...). The matrix is cached per quad and size
+	def __init__(self, rect, size):
+		self.rect = np.ascontiguousarray(rect, dtype = "float32")
+		self.size = (int(size[0]), int(size[1]))
+		self.matrix = _homography(self.rect.tobytes(), *self.size)
 
-	# now that we have the dimensions of the new image, construct
-	# the set of destination points to obtain a "birds eye view",
-	# (i.e. top-down view) of the image, again specifying points
-	# in the top-left, top-right, bottom-right, and bottom-left
-	# order
-	dst = np.array([
-		[0, 0],
-		[maxWidth - 1, 0],
-		[maxWidth - 1, maxHeight - 1],
-		[0, maxHeight - 1]], dtype = "float32")
+	def __call__(self, image, out = None):
+		# warp into out when it is an image of the target size
+		return cv2.warpPerspective(image, self.matrix, self.size, dst = out)
 
-	# compute the perspective transform matrix and then apply it
-	M = cv2.getPerspectiveTransform(rect, dst)
-	warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight))
+def warps(quads, size = None):
+	# the Warp of every (4, 2) quad of a batch, the points are
+	# ordered and the target sizes computed for all quads at
+	# once. With size every quad is warped to that fixed
+	# (width, height)
+	rects = order_points(np.asarray(quads).reshape(-1, 4, 2))
+	if size is None:
+		sizes = target_sizes(rects)
+	else:
+		sizes = [size] * len(rects)
+	return [Warp(rect, s) for (rect, s) in zip(rects, sizes)]
+
+def four_point_transforms(images, quads, size = None, out = None):
+	# apply every quad to every image, returns a list with the
+	# list of warped images of each quad. out[i][j] receives the
+	# warp of images[j] by quads[i] when given, e.g. an array of
+	# shape (len(quads), len(images), height, width[, channels])
+	# preallocated for a fixed size
+	result = []
+	for (i, warp) in enumerate(warps(quads, size)):
+		result.append([warp(image, None if out is None else out[i][j])
+			for (j, image) in enumerate(images)])
+	return result
+
+def four_point_transform(image, pts):
+	# obtain a consistent order of the points, compute the size
+	# of the new image and the perspective transform matrix and
+	# then apply it
+	(warp,) = warps(pts)
 
 	# return the warped image
-	return warped
\ No newline at end of file
+	return warp(image)
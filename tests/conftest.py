@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the modules import each other by name, as the scripts do with PYTHONPATH=src
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'ext'), os.path.join(ROOT, 'bench')]
@@ -0,0 +1,45 @@
+import numpy
+import pytest
+from scipy.ndimage import rank_filter
+
+import lines
+import processors
+
+
+def reference(image, rank, kernel_size):
+    # the rank filters the box filter counts replace
+    maxed_rows = rank_filter(image, rank, size=kernel_size)
+    maxed_cols = rank_filter(image, rank, size=kernel_size[::-1])
+    return numpy.minimum(image, numpy.minimum(maxed_rows, maxed_cols))
+
+
+@pytest.mark.parametrize('kernel_size, rank', [((2, 20), -5), ((2, 20), -40), ((2, 20), 0), ((2, 5), -3),
+                                               ((3, 7), 10), ((1, 1), 0), ((2, 40), -12)])
+@pytest.mark.parametrize('density', [0.05, 0.5, 0.95])
+def test_remove_lines_matches_rank_filter(kernel_size, rank, density):
+    rng = numpy.random.default_rng(0)
+    image = numpy.where(rng.random((97, 131)) < density, 255, 0).astype(numpy.uint8)
+    numpy.testing.assert_array_equal(lines.remove_lines(image, rank, kernel_size), reference(image, rank, kernel_size))
+
+
+def test_remove_lines_writes_to_out():
+    rng = numpy.random.default_rng(1)
+    image = numpy.where(rng.random((64, 48)) < 0.3, 255, 0).astype(numpy.uint8)
+    out = numpy.empty_like(image)
+    result = lines.remove_lines(image, -5, (2, 20), out=out)
+    assert result is out
+    numpy.testing.assert_array_equal(out, reference(image, -5, (2, 20)))
+
+
+def test_processor_falls_back_to_rank_filter_for_gray_images():
+    rng = numpy.random.default_rng(2)
+    image = rng.integers(0, 256, (50, 60), dtype=numpy.uint8)
+    numpy.testing.assert_array_equal(processors.remove_lines(None, image, rank=-5, kernel_size=(2, 20)),
+                                     reference(image, -5, (2, 20)))
+
+
+def test_min_count_rejects_ranks_outside_the_window():
+    with pytest.raises(ValueError):
+        lines.min_count(40, 40)
+    with pytest.raises(ValueError):
+        lines.min_count(-41, 40)
@@ -0,0 +1,58 @@
+import cv2
+import numpy
+import pytest
+
+import morphology
+
+SIZES = [(1, 1), (3, 3), (4, 7), (20, 2), (50, 50), (100, 100), (33, 140)]
+
+
+@pytest.fixture(params=[0.02, 0.4], ids=['sparse', 'dense'])
+def mask(request):
+    rng = numpy.random.default_rng(0)
+    return numpy.where(rng.random((211, 157)) < request.param, 255, 0).astype(numpy.uint8)
+
+
+def structure(kernel_size):
+    return cv2.getStructuringElement(cv2.MORPH_RECT, kernel_size)
+
+
+@pytest.mark.parametrize('kernel_size', SIZES)
+def test_dilate_and_erode_match_opencv(mask, kernel_size):
+    kernel = structure(kernel_size)
+    numpy.testing.assert_array_equal(morphology.rect_dilate(mask, kernel_size), cv2.dilate(mask, kernel))
+    numpy.testing.assert_array_equal(morphology.rect_erode(mask, kernel_size), cv2.erode(mask, kernel))
+
+
+@pytest.mark.parametrize('kernel_size', SIZES)
+def test_close_matches_opencv(mask, kernel_size):
+    expected = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, structure(kernel_size))
+    numpy.testing.assert_array_equal(morphology.rect_close(mask, kernel_size), expected)
+
+
+@pytest.mark.parametrize('kernel_size', SIZES)
+def test_zero_border_close_matches_a_padded_close(mask, kernel_size):
+    border = max(kernel_size) + 1
+    padded = cv2.copyMakeBorder(mask, border, border, border, border, cv2.BORDER_CONSTANT, value=0)
+    expected = cv2.morphologyEx(padded, cv2.MORPH_CLOSE, structure(kernel_size))[border:-border, border:-border]
+    numpy.testing.assert_array_equal(morphology.rect_close(mask, kernel_size, zero_border=True), expected)
+
+
+def test_other_dtypes_and_out():
+    rng = numpy.random.default_rng(1)
+    image = rng.random((80, 90)).astype(numpy.float32)
+    out = numpy.empty_like(image)
+    result = morphology.rect_dilate(image, (9, 5), out=out)
+    assert result is out
+    numpy.testing.assert_array_equal(out, cv2.dilate(image, structure((9, 5))))
+
+    flags = rng.random((80, 90)) < 0.3
+    numpy.testing.assert_array_equal(morphology.rect_erode(flags, (5, 9)),
+                                     cv2.erode(flags.view(numpy.uint8), structure((5, 9))).view(bool))
+
+
+def test_is_large():
+    assert not morphology.is_large((20, 20))
+    assert morphology.is_large((morphology.LARGE_CLOSE, 2), close=True)
+    assert not morphology.is_large((morphology.LARGE_CLOSE, 2))
+    assert morphology.is_large((2, morphology.LARGE_KERNEL))
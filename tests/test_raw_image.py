@@ -0,0 +1,73 @@
+import os
+
+import numpy
+import pytest
+
+import image_io
+import raw_image
+
+
+def images():
+    rng = numpy.random.default_rng(0)
+    mask = numpy.where(rng.random((37, 53)) < 0.3, 255, 0).astype(numpy.uint8)
+    return {
+        'mask': mask,
+        'bool': mask > 0,
+        'gray': rng.integers(0, 256, (37, 53), dtype=numpy.uint8),
+        'color': rng.integers(0, 256, (37, 53, 3), dtype=numpy.uint8),
+        'float': rng.random((5, 7)).astype(numpy.float32),
+        'int16 4d': rng.integers(-99, 99, (2, 3, 4, 5)).astype(numpy.int16),
+        'empty': numpy.zeros((0, 8), dtype=numpy.uint8),
+    }
+
+
+@pytest.mark.parametrize('name', list(images()))
+def test_bytes_round_trip(name):
+    image = images()[name]
+    loaded = raw_image.loads(raw_image.dumps(image))
+    assert loaded.dtype == image.dtype
+    numpy.testing.assert_array_equal(loaded, image)
+
+
+@pytest.mark.parametrize('name', list(images()))
+def test_file_round_trip(tmp_path, name):
+    image = images()[name]
+    path = str(tmp_path / ('image' + raw_image.EXTENSION))
+    raw_image.save(path, image)
+    loaded = raw_image.load(path)
+    assert loaded.dtype == image.dtype
+    numpy.testing.assert_array_equal(loaded, image)
+    # through image_io too, which picks the format by extension
+    numpy.testing.assert_array_equal(image_io.read(path), image)
+
+
+def test_masks_are_packed(tmp_path):
+    mask = images()['mask']
+    path = str(tmp_path / 'mask.raw')
+    raw_image.save(path, mask)
+    assert raw_image.RawImage(path).header.packed
+    assert os.path.getsize(path) == raw_image.HEADER_SIZE + mask.shape[0] * ((mask.shape[1] + 7) // 8)
+    numpy.testing.assert_array_equal(raw_image.RawImage(path).rows(5, 9), mask[5:9])
+
+
+def test_only_masks_can_be_packed():
+    with pytest.raises(ValueError):
+        raw_image.dumps(images()['gray'], pack=True)
+
+
+def test_bad_headers():
+    with pytest.raises(ValueError):
+        raw_image.loads(b'\x93RAW')
+    with pytest.raises(ValueError):
+        raw_image.loads(b'not a raw image'.ljust(raw_image.HEADER_SIZE, b'\0'))
+
+
+def test_run_artifacts(tmp_path):
+    for index in (10, 2, 1):
+        raw_image.save(str(tmp_path / ('step_%d.raw' % index)), numpy.full((4, 4), index, numpy.uint8))
+    (tmp_path / 'step_3.png').write_bytes(b'')
+    artifacts = raw_image.RunArtifacts(str(tmp_path))
+    assert list(artifacts) == ['step_1', 'step_2', 'step_10']
+    assert artifacts['step_10'][0, 0] == 10
+    with pytest.raises(KeyError):
+        artifacts['step_3']
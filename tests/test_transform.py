@@ -0,0 +1,62 @@
+import cv2
+import numpy
+import pytest
+
+import transform
+
+
+def reference(image, pts):
+    # the per-quad transform the batched one replaced
+    rect = transform.order_points(pts)
+    (tl, tr, br, bl) = rect
+    width = max(int(numpy.hypot(*(br - bl))), int(numpy.hypot(*(tr - tl))))
+    height = max(int(numpy.hypot(*(tr - br))), int(numpy.hypot(*(tl - bl))))
+    dst = numpy.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype='float32')
+    return cv2.warpPerspective(image, cv2.getPerspectiveTransform(rect, dst), (width, height))
+
+
+@pytest.fixture
+def images():
+    rng = numpy.random.default_rng(0)
+    color = rng.integers(0, 256, (300, 400, 3), dtype=numpy.uint8)
+    return [color, cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)]
+
+
+def random_quads(count, seed=0):
+    rng = numpy.random.default_rng(seed)
+    corners = numpy.array([[20, 20], [380, 20], [380, 280], [20, 280]], dtype='float32')
+    quads = corners + rng.uniform(-15, 15, (count, 4, 2)).astype('float32')
+    # the points come in any order
+    return numpy.array([quad[rng.permutation(4)] for quad in quads])
+
+
+def test_order_points_batch_matches_single():
+    quads = random_quads(10)
+    batch = transform.order_points(quads)
+    for quad, rect in zip(quads, batch):
+        numpy.testing.assert_array_equal(transform.order_points(quad), rect)
+
+
+def test_four_point_transform_matches_reference(images):
+    for quad in random_quads(5, seed=1):
+        numpy.testing.assert_array_equal(transform.four_point_transform(images[0], quad), reference(images[0], quad))
+
+
+def test_batched_transforms_match_one_by_one(images):
+    quads = random_quads(4, seed=2)
+    result = transform.four_point_transforms(images, quads)
+    for quad, warped in zip(quads, result):
+        for image, image_warped in zip(images, warped):
+            numpy.testing.assert_array_equal(image_warped, reference(image, quad))
+
+
+def test_fixed_size_transforms_write_to_out(images):
+    quads = random_quads(3, seed=3)
+    out = numpy.empty((len(quads), 1, 120, 160, 3), dtype=numpy.uint8)
+    result = transform.four_point_transforms(images[:1], quads, size=(160, 120), out=out)
+    for i, quad in enumerate(quads):
+        assert numpy.shares_memory(result[i][0], out)
+        rect = transform.order_points(quad)
+        expected = cv2.warpPerspective(images[0], cv2.getPerspectiveTransform(rect, transform.destination(160, 120)),
+                                       (160, 120))
+        numpy.testing.assert_array_equal(out[i, 0], expected)